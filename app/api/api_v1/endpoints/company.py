@@ -5,13 +5,27 @@ This module contains the routes for handling operations related to companies.
 
 
 """
-from fastapi import APIRouter, HTTPException, Body
-from fastapi.responses import JSONResponse
-from app.schemas.company import CompanyProfile, UpdateCompanyProfileModel
+from fastapi import APIRouter, HTTPException, Body, Depends, Request
+from app.core.responses import MongoJSONResponse
+from app.schemas.company import (
+    CompanyPatch,
+    CompanyProfile,
+    OpeningOut,
+    OpeningPage,
+    UpdateCompanyProfileModel,
+)
 from app.db.engine import db
+from app.core.config import settings
+from app.core.cache import cached_response, conditional_response, response_cache
+from app.crud.search import SearchMode, search_collection
+from app.crud.projection import expose_id, field_projection, model_projection
+from app.api.deps import Pagination
+from app.crud.pagination import fetch_page, stream_ndjson
+from app.crud.update import apply_update, build_update
 from bson import ObjectId
-from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from fastapi import Query
+from typing import Optional
 
 
 router = APIRouter()
@@ -28,29 +42,46 @@ router = APIRouter()
         200: {"description": "Successful Response"},
     },
 )
-async def retrieve_company_list():
+async def retrieve_company_list(
+    page: Pagination = Depends(),
+    projection: Optional[dict] = Depends(field_projection(CompanyProfile)),
+):
     """
-    Retrieve the list of companies from the collection.
+    Retrieve a page of companies from the collection.
+
+    Parameters:
+    - page (Pagination): The cursor, page size and streaming mode.
+    - projection (dict): The fields selected with the `fields` query parameter.
+      By default every stored field is returned, except the `password` still
+      held by a profile the user migration could not move, see
+      `migrate_users`.
 
     Returns:
-    - dict: A dictionary containing the list of companies.
+    - dict: A dictionary containing the page of companies and the cursor of
+      the next page, or an NDJSON stream of every company when `stream` is set.
 
     Raises:
     - HTTPException: If there is an error while retrieving the company list.
     """
+    query = {"role": "company"}
+    projection = projection or {"password": 0}
     try:
-        # Fetch all companies from the collection
-        companies = db.Company.find({"role": "company"}, {"password": 0})
-        company_list = [
-            {**company, "_id": str(company["_id"])} for company in companies
-        ]
-        return JSONResponse(
+        if page.stream:
+            return stream_ndjson(db.Company, query, projection, page.after, page.limit)
+
+        company_list, next_cursor = await fetch_page(
+            db.Company, query, projection, page.after, page.limit
+        )
+        return MongoJSONResponse(
             status_code=200,
             content={
                 "status": "success",
                 "data": company_list,
+                "next_cursor": next_cursor,
             },
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -73,38 +104,47 @@ async def retrieve_company_list():
     },
 )
 async def search_companies(
-    field: str = Query(..., description="The field to search by"),
     value: str = Query(..., description="The value to search for"),
+    field: Optional[str] = Query(
+        None, description="The field to search by, not used for full-text search"
+    ),
+    mode: SearchMode = Query(SearchMode.prefix, description="How to match the value"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
 ):
-    print("search field: ", field, value)
     """
-    Search for companies based on a specific field and value.
+    Search for companies based on a field and value, or by full text.
 
     Parameters:
-    - field (str): The field to search by (e.g., "company_name", "industry", etc.).
-    - value (str): The value to search for in the specified field.
+    - value (str): The value to search for.
+    - field (str): The field to search by (e.g., "name", "industry", "location").
+    - mode (SearchMode): `prefix` and `exact` match the start or the whole of
+      the field, ignoring case. `text` runs a full-text search ordered by relevance.
+    - limit (int): The maximum number of results.
 
     Returns:
-    - List[CompanyProfile]: A list of companies matching the search criteria.
+    - list: The matching companies, most relevant first.
 
     Raises:
-    - HTTPException: If there is an error during the search or no companies are found.
+    - HTTPException: If the field cannot be searched or nothing is found.
     """
     try:
-        # Create a dynamic query to find companies based on the provided field and value
-        search_query = {"role": "company", field: {"$regex": value, "$options": "i"}}
-        companies = db.Company.find(search_query, {"password": 0})
-        print("companies-----", companies)
-
-        # Convert ObjectId to string for each company in the result
-        company_list = [
-            {**company, "_id": str(company["_id"])} for company in companies
-        ]
-
+        company_list = await search_collection(
+            db.Company,
+            {"role": "company"},
+            field,
+            value,
+            mode,
+            model_projection(CompanyProfile),
+            limit,
+            expose_id,
+        )
         if not company_list:
-            raise HTTPException(status_code=404, detail=f"No companies found")
+            raise HTTPException(status_code=404, detail="No companies found")
 
-        return company_list
+        # The projection already gives the documents the shape of CompanyProfile.
+        return MongoJSONResponse(content=company_list)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -122,6 +162,7 @@ async def search_companies(
     response_model_by_alias=False,
     responses={
         400: {"description": "Bad Request"},
+        409: {"description": "Username or email already taken"},
         201: {"description": "Developer profile created successfully"},
         500: {"description": "Internal Server Error"},
     },
@@ -140,22 +181,85 @@ async def create_company(company: UpdateCompanyProfileModel):
     - HTTPException: If there is an issue creating the Company profile.
     """
     try:
-        result = db.Company.insert_one(company.dict(by_alias=True))
-        created_company = db.Company.find_one({"_id": result.inserted_id})
-
-        if created_company:
-            created_company["_id"] = str(
-                created_company["_id"]
-            )  # Convert ObjectId to string
-            return created_company
+        created_company = company.dict(by_alias=True)
+        await db.Company.insert_one(created_company)
+        created_company["_id"] = str(created_company["_id"])
+        return created_company
 
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Username or email already taken")
+    except Exception as e:
         raise HTTPException(
-            status_code=500, detail="Failed to create developer profile"
+            status_code=500, detail=f"Failed to create developer profile: {str(e)}"
         )
 
+
+@router.get(
+    "/{id}/openings",
+    response_description="List the job openings of a company",
+    responses={
+        401: {"description": "Unauthorized"},
+        404: {"description": "Invalid company id"},
+        200: {
+            "model": OpeningPage,
+            "description": "A page of openings, or an NDJSON stream of every "
+            "opening when `stream` is set",
+            "content": {"application/x-ndjson": {}},
+        },
+    },
+)
+async def retrieve_company_openings(
+    id: str,
+    page: Pagination = Depends(),
+    projection: Optional[dict] = Depends(field_projection(OpeningOut)),
+):
+    """
+    Retrieve a page of the job openings posted by a company.
+
+    Parameters:
+    - id (str): The ID of the company.
+    - page (Pagination): The cursor, page size and streaming mode.
+    - projection (dict): The fields selected with the `fields` query parameter.
+      Every field is returned by default.
+
+    Returns:
+    - dict: A dictionary containing the page of openings and the cursor of
+      the next page, or an NDJSON stream of every opening when `stream` is set.
+
+    Raises:
+    - HTTPException: If the company ID is invalid or the openings cannot be
+      retrieved.
+    """
+    try:
+        company_id = ObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
+
+    # Served by the company_id index, in the order the pages are cut.
+    query = {"company_id": company_id}
+    projection = projection or model_projection(OpeningOut)
+    try:
+        if page.stream:
+            return stream_ndjson(
+                db.Opening, query, projection, page.after, page.limit, expose_id
+            )
+
+        openings, next_cursor = await fetch_page(
+            db.Opening, query, projection, page.after, page.limit, expose_id
+        )
+        return MongoJSONResponse(
+            status_code=200,
+            content={"status": "success", "data": openings, "next_cursor": next_cursor},
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Failed to create developer profile: {str(e)}"
+            status_code=500,
+            detail={
+                "status": "error",
+                "message": str(e),
+            },
         )
 
 
@@ -170,31 +274,73 @@ async def create_company(company: UpdateCompanyProfileModel):
         200: {"description": "Successful Response"},
     },
 )
-async def get_company(id: str):
+async def get_company(
+    id: str,
+    request: Request,
+    projection: Optional[dict] = Depends(field_projection(CompanyProfile)),
+):
     """
     Get the record for a specific company, looked up by `id`.
 
     Parameters:
     - id (str): The ID of the company to retrieve.
+    - projection (dict): The fields selected with the `fields` query parameter.
+      Every field is returned by default.
 
     Returns:
-    - dict: The company profile.
+    - dict: The company profile, or an empty 304 response if it matches the
+      `If-None-Match` header.
 
     Raises:
     - HTTPException: If the company with the specified ID is not found.
     """
-    if (company := db.Company.find_one({"_id": ObjectId(id)})) is not None:
+    cache_key = f"company:{id}:{','.join(sorted(projection or {}))}"
+    if (cached := await response_cache.get(cache_key)) is not None:
+        return conditional_response(request, cached)
+
+    company = await db.Company.find_one(
+        {"_id": ObjectId(id)}, projection or model_projection(CompanyProfile)
+    )
+    if company is not None:
         company["_id"] = str(company["_id"])  # Convert ObjectId to string
-        return company
+        include = {"id", *projection} if projection else None
+        cached = cached_response(
+            CompanyProfile(**company).model_dump_json(include=include).encode()
+        )
+        await response_cache.set(cache_key, cached)
+        return conditional_response(request, cached)
 
     raise HTTPException(status_code=404, detail=f"company {id} not found")
 
 
+async def _update_company(id: str, update: dict, version: Optional[int] = None):
+    try:
+        object_id = ObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
+
+    try:
+        updated_company = await apply_update(db.Company, object_id, update, version)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Username or email already taken")
+    if updated_company is None:
+        raise HTTPException(status_code=404, detail=f"company {id} not found")
+    if update:
+        await response_cache.delete_prefix(f"company:{id}:")
+
+    updated_company["_id"] = str(updated_company["_id"])  # Convert ObjectId to string
+    return updated_company
+
+
 @router.put(
     "/{id}",
     response_description="Update Company Profile",
     response_model=CompanyProfile,
     response_model_by_alias=False,
+    responses={
+        404: {"description": "Company not found"},
+        409: {"description": "Username or email already taken"},
+    },
 )
 async def update_company(id: str, company: UpdateCompanyProfileModel = Body(...)):
     """
@@ -213,25 +359,35 @@ async def update_company(id: str, company: UpdateCompanyProfileModel = Body(...)
     Raises:
     - HTTPException: If the company profile with the given ID is not found.
     """
-    company_dict = company.dict(by_alias=True)
-    company_updates = {k: v for k, v in company_dict.items() if v is not None}
-    if company_updates:
-        updated_company = db.Company.find_one_and_update(
-            {"_id": ObjectId(id)},
-            {"$set": company_updates},
-            return_document=ReturnDocument.AFTER,
-            upsert=True,
-        )
+    return await _update_company(id, build_update(company, ignore_none=True))
 
-        if updated_company:
-            updated_company["_id"] = str(
-                updated_company["_id"]
-            )  # Convert ObjectId to string
-            return updated_company
 
-    # The update is empty, but we should still return the matching document:
-    if (company := db.Company.find_one({"_id": ObjectId(id)})) is not None:
-        company["_id"] = str(company["_id"])  # Convert ObjectId to string
-        return company
+@router.patch(
+    "/{id}",
+    response_description="Partially update Company Profile",
+    response_model=CompanyProfile,
+    response_model_by_alias=False,
+    responses={
+        404: {"description": "Company not found"},
+        409: {
+            "description": "Company changed since the given version, or the "
+            "username or email is already taken"
+        },
+    },
+)
+async def patch_company(id: str, company: CompanyPatch = Body(...)):
+    """
+    Apply a partial update to an existing company profile.
 
-    raise HTTPException(status_code=404, detail=f"company {id} not found")
+    Parameters:
+    - id (str): The ID of the company profile to be updated.
+    - company (CompanyPatch): The fields to change.
+
+    Returns:
+    - CompanyProfile: The updated company profile.
+
+    Raises:
+    - HTTPException: If the profile is not found, or has changed since
+      `version`.
+    """
+    return await _update_company(id, build_update(company), company.version)
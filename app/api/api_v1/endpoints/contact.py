@@ -1,37 +1,102 @@
-from fastapi import APIRouter, Form, HTTPException, Depends
+import asyncio
+import logging
+from fastapi import APIRouter, Form, HTTPException, Depends, Query
 from app.db.engine import db
-from app.api.deps import get_current_user
+from app.db.writebehind import QueueFull, acknowledge, contact_queue
+from app.core.responses import MongoJSONResponse
+from app.api.deps import get_current_user, Pagination
+from app.crud.pagination import fetch_page, stream_ndjson
+from app.crud.export import ExportFormat, stream_export
+from datetime import datetime
+from typing import Optional
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.post("/submit")
 async def submit_contact_form(email: str = Form(...), message: str = Form(...)):
-    print(f"Received contact form from: {email}, message: {message}")
+    logger.debug("Received contact form from %s", email, extra={"body": message})
+    document = {"email": email, "message": message}
     try:
-        result = db.contact.insert_one({"email": email, "message": message})
-        if result.inserted_id:
-            return {
-                "message": "Contact form submitted successfully",
-                "email_id": str(result.inserted_id),
-            }
-        else:
-            raise HTTPException(
-                status_code=500, detail="Contact form submission failed"
-            )
-    except Exception as e:
-        return {"error": str(e)}
+        # Written in a batch with the other submissions.
+        inserted = await acknowledge(contact_queue.submit(document))
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+    except asyncio.TimeoutError:
+        # Still queued, and written once the database catches up.
+        return MongoJSONResponse(
+            status_code=202,
+            content={
+                "message": "Contact form accepted",
+                "email_id": str(document["_id"]),
+            },
+        )
+
+    if inserted is None:
+        raise HTTPException(status_code=500, detail="Contact form submission failed")
+    return {
+        "message": "Contact form submitted successfully",
+        "email_id": str(document["_id"]),
+    }
+
+
+def _contact_entry(document: dict) -> dict:
+    return {"email": document.get("email"), "message": document.get("message")}
 
 
 @router.get("/list")
-async def list_contact_messages(current_user: dict = Depends(get_current_user)):
+async def list_contact_messages(
+    page: Pagination = Depends(), current_user: dict = Depends(get_current_user)
+):
+    query, projection = {}, {"email": 1, "message": 1}
     try:
-        waitlist_messages = list(
-            db.contact.find({}, {"_id": 0, "email": 1, "message": 1})
+        if page.stream:
+            return stream_ndjson(
+                db.contact, query, projection, page.after, page.limit, _contact_entry
+            )
+
+        waitlist_messages, next_cursor = await fetch_page(
+            db.contact, query, projection, page.after, page.limit, _contact_entry
         )
-        return {"waitlist_messages": waitlist_messages}
+        return {"waitlist_messages": waitlist_messages, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error listing contact messages: {str(e)}"
         )
+
+
+@router.get("/export")
+async def export_contact_messages(
+    format: ExportFormat = Query(ExportFormat.csv, description="Format of the file"),
+    since: Optional[datetime] = Query(
+        None, description="Only export the messages submitted since this time"
+    ),
+    gzip: bool = Query(False, description="Gzip the file"),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Download every message as a CSV or NDJSON file.
+
+    The file is streamed a batch at a time, so exports of any size start
+    right away and use constant memory. Rows are ordered by submission time.
+
+    Parameters:
+    - format (ExportFormat): `csv` or `ndjson`.
+    - since (datetime): Only export the messages submitted since this time.
+    - gzip (bool): Gzip the file.
+
+    Returns:
+    - StreamingResponse: The file, with the `id`, `email`, `message` and
+      `created_at` of every message.
+    """
+    return stream_export(
+        db.contact, ["email", "message"], format, "contact", since, gzip
+    )
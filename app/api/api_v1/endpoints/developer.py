@@ -3,15 +3,32 @@ developers.py
 
 This module contains the routes for handling operations related to developers.
 """
-from fastapi import APIRouter, HTTPException, Body, Depends
-from fastapi.responses import JSONResponse
-from app.schemas.developer import DeveloperProfile, UpdateDeveloperModel
+import logging
+from fastapi import APIRouter, HTTPException, Body, Depends, Request
+from app.core.responses import MongoJSONResponse
+from app.schemas.developer import (
+    DeveloperPatch,
+    DeveloperProfile,
+    UpdateDeveloperModel,
+)
 from app.db.engine import db
+from app.core.config import settings
+from app.core.cache import cached_response, conditional_response, response_cache
+from app.crud.search import SearchMode, search_collection
+from app.crud.projection import expose_id, field_projection, model_projection
+from app.api.deps import Pagination
+from app.crud.pagination import fetch_page, stream_ndjson
+from app.crud.update import apply_update, build_update
+from app.core.matching import fetch_matches, skill_index
+from app.crud.projection import select_fields
+from app.schemas.company import OpeningOut
 from fastapi import Query
+from typing import Optional
 from bson import ObjectId
-from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.get(
@@ -25,29 +42,48 @@ router = APIRouter()
         200: {"description": "Successful Response"},
     },
 )
-async def retrieve_developer_list():
+async def retrieve_developer_list(
+    page: Pagination = Depends(),
+    projection: Optional[dict] = Depends(field_projection(DeveloperProfile)),
+):
     """
-    Retrieve the list of developers from the collection.
+    Retrieve a page of developers from the collection.
+
+    Parameters:
+    - page (Pagination): The cursor, page size and streaming mode.
+    - projection (dict): The fields selected with the `fields` query parameter.
+      By default every stored field is returned, except the `password` still
+      held by a profile the user migration could not move, see
+      `migrate_users`.
 
     Returns:
-    - dict: A dictionary containing the list of developers.
+    - dict: A dictionary containing the page of developers and the cursor of
+      the next page, or an NDJSON stream of every developer when `stream` is set.
 
     Raises:
     - HTTPException: If there is an error while retrieving the developer list.
     """
+    query = {"role": "developer"}
+    projection = projection or {"password": 0}
     try:
-        # Fetch all developers from the collection
-        developers = db.Developers.find({"role": "developer"}, {"password": 0})
-        developer_list = [
-            {**developer, "_id": str(developer["_id"])} for developer in developers
-        ]
-        return JSONResponse(
+        if page.stream:
+            return stream_ndjson(
+                db.Developers, query, projection, page.after, page.limit
+            )
+
+        developer_list, next_cursor = await fetch_page(
+            db.Developers, query, projection, page.after, page.limit
+        )
+        return MongoJSONResponse(
             status_code=200,
             content={
                 "status": "success",
                 "data": developer_list,
+                "next_cursor": next_cursor,
             },
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -70,37 +106,52 @@ async def retrieve_developer_list():
     },
 )
 async def search_developers(
-    field: str = Query(..., description="The field to search by"),
     value: str = Query(..., description="The value to search for"),
+    field: Optional[str] = Query(
+        None, description="The field to search by, not used for full-text search"
+    ),
+    mode: SearchMode = Query(SearchMode.prefix, description="How to match the value"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
 ):
     """
-    Search for companies based on a specific field and value.
+    Search for developers based on a field and value, or by full text.
 
     Parameters:
-    - field (str): The field to search by (e.g., "company_name", "industry", etc.).
-    - value (str): The value to search for in the specified field.
+    - value (str): The value to search for.
+    - field (str): The field to search by (e.g., "name", "skills", "location").
+    - mode (SearchMode): `prefix` and `exact` match the start or the whole of
+      the field, ignoring case. `text` runs a full-text search ordered by relevance.
+    - limit (int): The maximum number of results.
 
     Returns:
-    - List[CompanyProfile]: A list of companies matching the search criteria.
+    - list: The matching developers, most relevant first.
 
     Raises:
-    - HTTPException: If there is an error during the search or no companies are found.
+    - HTTPException: If the field cannot be searched or nothing is found.
     """
     try:
-        # Create a dynamic query to find companies based on the provided field and value
-        search_query = {"role": "developer", field: {"$regex": value, "$options": "i"}}
-        print("search_query:", search_query)
-        developers = db.Developers.find(search_query, {"password": 0})
-        # Convert ObjectId to string for each company in the result
-        developer_list = [
-            {**developer, "_id": str(developer["_id"])} for developer in developers
-        ]
-
-        print("developer_list", developer_list)
+        developer_list = await search_collection(
+            db.Developers,
+            {"role": "developer"},
+            field,
+            value,
+            mode,
+            model_projection(DeveloperProfile),
+            limit,
+            expose_id,
+        )
+        logger.debug(
+            "Developer search matched %d profiles",
+            len(developer_list),
+            extra={"results": developer_list},
+        )
         if not developer_list:
-            raise HTTPException(status_code=404, detail=f"No developers found")
+            raise HTTPException(status_code=404, detail="No developers found")
 
-        return developer_list
+        # The projection already gives the documents the shape of DeveloperProfile.
+        return MongoJSONResponse(content=developer_list)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -118,6 +169,7 @@ async def search_developers(
     response_model_by_alias=False,
     responses={
         400: {"description": "Bad Request"},
+        409: {"description": "Username or email already taken"},
         201: {"description": "Developer profile created successfully"},
         500: {"description": "Internal Server Error"},
     },
@@ -138,19 +190,18 @@ async def create_developer(developer: UpdateDeveloperModel):
     try:
         # Assuming db is your MongoDB connection object
         # and Developers is your MongoDB collection for developers
-        result = db.Developers.insert_one(developer.dict(by_alias=True))
-        created_developer = db.Developers.find_one({"_id": result.inserted_id})
-
-        if created_developer:
-            created_developer["_id"] = str(
-                created_developer["_id"]
-            )  # Convert ObjectId to string
-            return created_developer
-
-        raise HTTPException(
-            status_code=500, detail="Failed to create developer profile"
+        created_developer = developer.dict(by_alias=True)
+        # insert_one sets the `_id` of the document, which is then exactly
+        # what was stored; there is no need to read it back.
+        await db.Developers.insert_one(created_developer)
+        skill_index.set_developer(
+            created_developer["_id"], created_developer.get("skills")
         )
+        created_developer["_id"] = str(created_developer["_id"])
+        return created_developer
 
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Username or email already taken")
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to create developer profile: {str(e)}"
@@ -168,36 +219,156 @@ async def create_developer(developer: UpdateDeveloperModel):
         200: {"description": "Successful Response"},
     },
 )
-async def get_developer(id: str):
+async def get_developer(
+    id: str,
+    request: Request,
+    projection: Optional[dict] = Depends(field_projection(DeveloperProfile)),
+):
     """
     Get the record for a specific developer, looked up by `id`.
 
     Parameters:
     - id (str): The ID of the developer to retrieve.
+    - projection (dict): The fields selected with the `fields` query parameter.
+      Every field is returned by default.
 
     Returns:
-    - dict: The developer profile.
+    - dict: The developer profile, or an empty 304 response if it matches the
+      `If-None-Match` header.
 
     Raises:
     - HTTPException: If the developer with the specified ID is not found.
     """
+    cache_key = f"developer:{id}:{','.join(sorted(projection or {}))}"
+    if (cached := await response_cache.get(cache_key)) is not None:
+        return conditional_response(request, cached)
+
     try:
         object_id = ObjectId(id)
     except Exception:
         raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
 
-    if (developer := db.Developers.find_one({"_id": object_id})) is not None:
+    developer = await db.Developers.find_one(
+        {"_id": object_id}, projection or model_projection(DeveloperProfile)
+    )
+    if developer is not None:
         developer["_id"] = str(developer["_id"])  # Convert ObjectId to string
-        return developer
+        include = {"id", *projection} if projection else None
+        cached = cached_response(
+            DeveloperProfile(**developer).model_dump_json(include=include).encode()
+        )
+        await response_cache.set(cache_key, cached)
+        return conditional_response(request, cached)
 
     raise HTTPException(status_code=404, detail=f"Developer {id} not found")
 
 
+@router.get(
+    "/{id}/recommended-jobs",
+    response_description="Rank job postings by how well they fit a developer",
+    responses={
+        401: {"description": "Unauthorized"},
+        404: {"description": "Developer not found"},
+        503: {"description": "The matching index is still being built"},
+        200: {"description": "Successful Response"},
+    },
+)
+async def recommend_jobs(
+    id: str,
+    limit: int = Query(settings.MATCH_LIMIT_DEFAULT, ge=1, le=settings.MATCH_LIMIT_MAX),
+    projection: Optional[dict] = Depends(field_projection(OpeningOut)),
+):
+    """
+    Rank the active job postings whose needed skills best match the skills of
+    a developer.
+
+    Job postings are scored between 0 and 1 by the overlap of their skills
+    with the developer's, rare skills counting for more than common ones.
+
+    Parameters:
+    - id (str): The ID of the developer.
+    - limit (int): The number of job postings to return.
+    - projection (dict): The fields selected with the `fields` query
+      parameter, the `summary` fields by default.
+
+    Returns:
+    - dict: The best matching job postings first, each with its `score` and
+      the `matched_skills` it shares with the developer.
+
+    Raises:
+    - HTTPException: If the developer is not found, or the index is not ready
+      yet.
+    """
+    try:
+        object_id = ObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
+    if not skill_index.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="The matching index is still being built",
+            headers={"Retry-After": "5"},
+        )
+
+    try:
+        developer = await db.Developers.find_one({"_id": object_id}, {"skills": 1})
+        if developer is None:
+            raise HTTPException(status_code=404, detail=f"Developer {id} not found")
+
+        matches = skill_index.top_matches(
+            skill_index.openings, developer.get("skills"), limit
+        )
+        openings = await fetch_matches(
+            db.Opening, matches, projection or select_fields(OpeningOut, "summary")
+        )
+        for opening in openings:
+            expose_id(opening)
+        return MongoJSONResponse(content={"status": "success", "data": openings})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "status": "error",
+                "message": str(e),
+            },
+        )
+
+
+async def _update_developer(id: str, update: dict, version: Optional[int] = None):
+    try:
+        object_id = ObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
+
+    try:
+        updated_developer = await apply_update(
+            db.Developers, object_id, update, version
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Username or email already taken")
+    if updated_developer is None:
+        raise HTTPException(status_code=404, detail=f"Developer {id} not found")
+    if update:
+        await response_cache.delete_prefix(f"developer:{id}:")
+        skill_index.set_developer(object_id, updated_developer.get("skills"))
+
+    updated_developer["_id"] = str(
+        updated_developer["_id"]
+    )  # Convert ObjectId to string
+    return updated_developer
+
+
 @router.put(
     "/{id}",
     response_description="Update Developer Profile",
     response_model=DeveloperProfile,
     response_model_by_alias=False,
+    responses={
+        404: {"description": "Developer not found"},
+        409: {"description": "Username or email already taken"},
+    },
 )
 async def update_developer(id: str, developer: UpdateDeveloperModel = Body(...)):
     """
@@ -216,28 +387,38 @@ async def update_developer(id: str, developer: UpdateDeveloperModel = Body(...))
     Raises:
     - HTTPException: If the developer profile with the given ID is not found.
     """
-    developer_dict = developer.dict(by_alias=True)
-    developer_updates = {k: v for k, v in developer_dict.items() if v is not None}
-    if developer_updates:
-        updated_developer = db.Developers.find_one_and_update(
-            {"_id": ObjectId(id)},
-            {"$set": developer_updates},
-            return_document=ReturnDocument.AFTER,
-            upsert=True,
-        )
+    return await _update_developer(id, build_update(developer, ignore_none=True))
 
-        if updated_developer:
-            updated_developer["_id"] = str(
-                updated_developer["_id"]
-            )  # Convert ObjectId to string
-            return updated_developer
 
-    # The update is empty, but we should still return the matching document:
-    if (developer := db.Developers.find_one({"_id": ObjectId(id)})) is not None:
-        developer["_id"] = str(developer["_id"])  # Convert ObjectId to string
-        return developer
+@router.patch(
+    "/{id}",
+    response_description="Partially update Developer Profile",
+    response_model=DeveloperProfile,
+    response_model_by_alias=False,
+    responses={
+        404: {"description": "Developer not found"},
+        409: {
+            "description": "Developer changed since the given version, or the "
+            "username or email is already taken"
+        },
+    },
+)
+async def patch_developer(id: str, developer: DeveloperPatch = Body(...)):
+    """
+    Apply a partial update to an existing developer profile.
 
-    raise HTTPException(status_code=404, detail=f"Developer {id} not found")
+    Parameters:
+    - id (str): The ID of the developer profile to be updated.
+    - developer (DeveloperPatch): The fields to change.
+
+    Returns:
+    - DeveloperProfile: The updated developer profile.
+
+    Raises:
+    - HTTPException: If the profile is not found, or has changed since
+      `version`.
+    """
+    return await _update_developer(id, build_update(developer), developer.version)
 
 
 # @router.delete(
@@ -258,7 +439,9 @@ async def update_developer(id: str, developer: UpdateDeveloperModel = Body(...))
 #             developer_object_id = ObjectId(developer_id)
 #         except Exception:
 #             raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
-#         deleted_developer = db.Developers.find_one_and_delete({"_id": developer_object_id})
+#         deleted_developer = await db.Developers.find_one_and_delete(
+#             {"_id": developer_object_id}
+#         )
 #         if deleted_developer:
 #             deleted_developer["_id"] = str(deleted_developer["_id"])
 #             return {"message": "Developer account deleted successfully", "job": deleted_developer}
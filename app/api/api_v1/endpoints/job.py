@@ -1,19 +1,47 @@
-from fastapi import APIRouter, Query
+import logging
+from fastapi import APIRouter, Query, Depends, Request
 from fastapi import APIRouter, HTTPException, Body
-from fastapi.responses import JSONResponse
+from app.core.responses import MongoJSONResponse, dumps
 from app.schemas.company import (
     CompanyProfile,
     UpdateCompanyProfileModel,
     Opening,
-    OpeningUpdate,
+    OpeningPatch,
     OpeningOut,
+    OpeningStatus,
 )
 from app.db.engine import db
+from app.core.config import settings
+from app.core.cache import cached_response, conditional_response, response_cache
+from app.crud.search import SearchMode, search_collection
+from app.crud.projection import expose_id, field_projection, model_projection
+from app.api.deps import Pagination, get_current_user
+from app.crud.pagination import fetch_page, stream_ndjson
+from app.crud.job import (
+    JobSort,
+    SkillMatch,
+    board_filter,
+    insert_openings,
+    query_openings,
+    update_openings,
+)
+from app.crud.update import apply_update, build_update
+from app.core.matching import fetch_matches, skill_index
+from app.crud.projection import select_fields
+from app.schemas.developer import DeveloperProfile
 from bson import ObjectId
-from pymongo import ReturnDocument
-from typing import List
+from typing import List, Optional
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _company_id(current_user: dict) -> ObjectId:
+    # Openings belong to the company that posts them, and only that company
+    # can change or delete them.
+    if current_user.get("role") != "company":
+        raise HTTPException(status_code=403, detail="Only companies can manage jobs")
+    return ObjectId(current_user["sub"])
 
 
 @router.get(
@@ -26,16 +54,50 @@ router = APIRouter()
         200: {"description": "Successful Response"},
     },
 )
-async def get_job_list():
+async def get_job_list(
+    request: Request,
+    page: Pagination = Depends(),
+    projection: Optional[dict] = Depends(field_projection(OpeningOut)),
+):
+    """
+    Retrieve a page of job postings.
+
+    Only the fields selected with the `fields` query parameter are returned,
+    every field by default. The cursor of the next page is returned in the
+    `X-Next-Cursor` header. When `stream` is set, every job posting is
+    streamed as NDJSON instead.
+    Pages are cached until a job posting changes, and an empty 304 response is
+    returned if the page matches the `If-None-Match` header.
+    """
+    projection = projection or model_projection(OpeningOut)
     try:
-        # Assuming db is your MongoDB connection object
-        # and Opening is your MongoDB collection
-        job_list = list(db.Opening.find())
+        if page.stream:
+            return stream_ndjson(
+                db.Opening,
+                {},
+                projection,
+                page.after,
+                page.limit,
+                expose_id,
+            )
 
-        # Convert ObjectId to string for each job in the result
-        job_list = [{**job, "_id": str(job["_id"])} for job in job_list]
+        cache_key = f"jobs:{page.after}:{page.limit}:{','.join(sorted(projection))}"
+        if (cached := await response_cache.get(cache_key)) is None:
+            job_list, next_cursor = await fetch_page(
+                db.Opening,
+                {},
+                projection,
+                page.after,
+                page.limit,
+                expose_id,
+            )
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            cached = cached_response(dumps(job_list), headers)
+            await response_cache.set(cache_key, cached)
 
-        return job_list
+        return conditional_response(request, cached)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to retrieve job list: {str(e)}"
@@ -49,67 +111,350 @@ async def get_job_list():
     response_model_by_alias=False,
     responses={
         401: {"description": "Unauthorized"},
+        403: {"description": "Only companies can manage jobs"},
         201: {"description": "Job posting created successfully"},
     },
 )
-async def post_job(job: Opening):
-    print("opening:", job.dict())
+async def post_job(job: Opening, current_user: dict = Depends(get_current_user)):
+    logger.debug("Creating job opening", extra={"opening": job})
+    company_id = _company_id(current_user)
     try:
-        # Assuming db is your MongoDB connection object
-        # and Opening is your MongoDB collection
-        new_job = db.Opening.insert_one(job.model_dump(by_alias=True))
-
-        # You can get the inserted document from the database
-        # using the inserted_id and return it in the response
-        inserted_job = db.Opening.find_one({"_id": new_job.inserted_id})
-        # Convert ObjectId to string for serialization
+        inserted_job = {**job.model_dump(by_alias=True), "company_id": company_id}
+        await db.Opening.insert_one(inserted_job)
+        await response_cache.delete_prefix("jobs:")
+        skill_index.set_opening(
+            inserted_job["_id"], inserted_job["skills_needed"], inserted_job["status"]
+        )
         inserted_job["_id"] = str(inserted_job["_id"])
+        inserted_job["company_id"] = str(company_id)
         return {"message": "Job posting created successfully", "job": inserted_job}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create job: {str(e)}")
 
 
+@router.post(
+    "/bulk",
+    response_description="Create several job postings",
+    responses={
+        401: {"description": "Unauthorized"},
+        403: {"description": "Only companies can manage jobs"},
+        201: {"description": "Every job posting was created"},
+        207: {"description": "Some job postings could not be created"},
+    },
+)
+async def post_jobs(
+    jobs: List[Opening] = Body(
+        ..., min_length=1, max_length=settings.JOB_BULK_MAX_SIZE
+    ),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Create several job postings in one request.
+
+    Parameters:
+    - jobs (list): The job postings, at most `JOB_BULK_MAX_SIZE`.
+
+    Returns:
+    - dict: The outcome of every job posting, in order: its `id` when it was
+      created, or the `error` that prevented it. The status is 207 if any
+      job posting failed.
+    """
+    company_id = _company_id(current_user)
+    try:
+        openings = [
+            {**job.model_dump(by_alias=True), "company_id": company_id} for job in jobs
+        ]
+        results = await insert_openings(openings)
+        await response_cache.delete_prefix("jobs:")
+        for result, opening in zip(results, openings):
+            if result["status"] == "created":
+                skill_index.set_opening(
+                    opening["_id"], opening["skills_needed"], opening["status"]
+                )
+        failed = sum(result["status"] == "error" for result in results)
+        logger.info("Created %d of %d job openings", len(jobs) - failed, len(jobs))
+        return MongoJSONResponse(
+            status_code=207 if failed else 201,
+            content={"status": "partial" if failed else "success", "results": results},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create jobs: {str(e)}")
+
+
+@router.patch(
+    "/bulk",
+    response_description="Update several job postings",
+    responses={
+        401: {"description": "Unauthorized"},
+        403: {"description": "Only companies can manage jobs"},
+        200: {"description": "Every job posting was updated"},
+        207: {"description": "Some job postings could not be updated"},
+    },
+)
+async def update_jobs(
+    jobs: List[OpeningPatch] = Body(
+        ..., min_length=1, max_length=settings.JOB_BULK_MAX_SIZE
+    ),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Update several job postings in one request.
+
+    Each update is applied like `PATCH /job/update`: only the fields sent are
+    changed, and it is rejected if `version` is sent and the job posting has
+    changed since. Job postings of other companies are reported as not found.
+
+    Parameters:
+    - jobs (list): The updates, each with the `id` of the job posting to
+      change, at most `JOB_BULK_MAX_SIZE`.
+
+    Returns:
+    - dict: The outcome of every update, in order. The status is 207 if any
+      update failed.
+    """
+    company_id = _company_id(current_user)
+    try:
+        results = await update_openings(jobs, company_id)
+        await response_cache.delete_prefix("jobs:")
+        # Array patches leave the resulting skills to the database.
+        reindex = [
+            ObjectId(result["id"])
+            for result, job in zip(results, jobs)
+            if result["status"] == "updated"
+            and {"skills_needed", "status"} & job.model_fields_set
+        ]
+        if reindex:
+            await skill_index.refresh_openings(reindex)
+        failed = sum(result["status"] != "updated" for result in results)
+        logger.info("Updated %d of %d job openings", len(jobs) - failed, len(jobs))
+        return MongoJSONResponse(
+            status_code=207 if failed else 200,
+            content={"status": "partial" if failed else "success", "results": results},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update jobs: {str(e)}")
+
+
+@router.get(
+    "/query",
+    response_description="Query the job board",
+    responses={
+        400: {"description": "Invalid pagination cursor"},
+        401: {"description": "Unauthorized"},
+        200: {"description": "Successful Response"},
+    },
+)
+async def query_jobs(
+    status: List[OpeningStatus] = Query(
+        [OpeningStatus.active], description="Statuses to include"
+    ),
+    skills: List[str] = Query([], description="Skills the openings need"),
+    skill_match: SkillMatch = Query(
+        SkillMatch.all, description="Whether openings need all or any of the skills"
+    ),
+    job_role: Optional[str] = Query(None, description="Exact job role"),
+    qualification: Optional[str] = Query(
+        None, description="Exact qualification required"
+    ),
+    min_openings: Optional[int] = Query(None, ge=1),
+    max_openings: Optional[int] = Query(None, ge=1),
+    sort: JobSort = Query(JobSort.newest, description="Order of the results"),
+    after: Optional[str] = Query(
+        None, description="Cursor returned as next_cursor by the previous page"
+    ),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    facets: bool = Query(False, description="Include the facet counts"),
+    projection: Optional[dict] = Depends(field_projection(OpeningOut)),
+):
+    """
+    Query the job board: filter job postings, and optionally count the
+    matching ones per skill, job role and status.
+
+    String filters ignore case. Only active job postings are included unless
+    `status` says otherwise.
+
+    Parameters:
+    - status (list): The statuses to include.
+    - skills (list): Skills the job postings need, all of them or any of them
+      depending on `skill_match`.
+    - job_role (str), qualification (str): Exact values to match.
+    - min_openings (int), max_openings (int): Bounds on `no_of_openings`.
+    - sort (JobSort): `newest`, `oldest` or `openings` (most openings first).
+    - after (str), limit (int): The cursor and size of the page.
+    - facets (bool): Whether to also count the matching job postings, which
+      reads every match rather than a page of them; typically only asked for
+      with the first page.
+
+    Returns:
+    - dict: The page of job postings as `data`, the cursor of the next page,
+      and with `facets` the `total` number of matches and the `facets` counts.
+
+    Raises:
+    - HTTPException: If the cursor is invalid or the query fails.
+    """
+    query = board_filter(
+        status,
+        skills,
+        skill_match,
+        job_role,
+        qualification,
+        min_openings,
+        max_openings,
+    )
+    try:
+        page = await query_openings(
+            query,
+            sort,
+            after,
+            limit,
+            projection or model_projection(OpeningOut),
+            facets,
+        )
+        for document in page["data"]:
+            expose_id(document)
+        return MongoJSONResponse(content={"status": "success", **page})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "status": "error",
+                "message": str(e),
+            },
+        )
+
+
 @router.get(
     "/search",
-    response_description="Search for developers based on criteria",
-    response_model=list[OpeningOut],
-    response_model_by_alias=False,
+    response_description="Search for job postings based on criteria",
     responses={
         404: {"description": "No openings found"},
         401: {"description": "Unauthorized"},
-        200: {"description": "Successful Response"},
+        200: {"model": List[OpeningOut], "description": "Successful Response"},
     },
 )
 async def search_jobs(
-    field: str = Query(..., description="The field to search by"),
     value: str = Query(..., description="The value to search for"),
+    field: Optional[str] = Query(
+        None, description="The field to search by, not used for full-text search"
+    ),
+    mode: SearchMode = Query(SearchMode.prefix, description="How to match the value"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
 ):
     """
-    Search for companies based on a specific field and value.
+    Search for job openings based on a field and value, or by full text.
 
     Parameters:
-    - field (str): The field to search by (e.g., "company_name", "industry", etc.).
-    - value (str): The value to search for in the specified field.
+    - value (str): The value to search for.
+    - field (str): The field to search by (e.g., "job_role", "skills_needed", "status").
+    - mode (SearchMode): `prefix` and `exact` match the start or the whole of
+      the field, ignoring case. `text` runs a full-text search ordered by relevance.
+    - limit (int): The maximum number of results.
 
     Returns:
-    - List[CompanyProfile]: A list of companies matching the search criteria.
+    - list: The matching job openings, most relevant first.
 
     Raises:
-    - HTTPException: If there is an error during the search or no companies are found.
+    - HTTPException: If the field cannot be searched or nothing is found.
     """
     try:
-        # Create a dynamic query to find companies based on the provided field and value
-        search_query = {field: {"$regex": value, "$options": "i"}}
-        print("search_query:", search_query)
-        openings = db.Opening.find(search_query)
-        # Convert ObjectId to string for each company in the result
-        opening_list = [{**opening, "_id": str(opening["_id"])} for opening in openings]
-
-        print("opening_list", opening_list)
+        opening_list = await search_collection(
+            db.Opening,
+            {},
+            field,
+            value,
+            mode,
+            model_projection(OpeningOut),
+            limit,
+            expose_id,
+        )
+        logger.debug(
+            "Job search matched %d openings",
+            len(opening_list),
+            extra={"results": opening_list},
+        )
         if not opening_list:
-            raise HTTPException(status_code=404, detail=f"No developers found")
+            raise HTTPException(status_code=404, detail="No openings found")
+
+        # The projection already gives the documents the shape of OpeningOut.
+        return MongoJSONResponse(content=opening_list)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "status": "error",
+                "message": str(e),
+            },
+        )
+
+
+@router.get(
+    "/{id}/matches",
+    response_description="Rank developers by how well they fit a job posting",
+    responses={
+        401: {"description": "Unauthorized"},
+        404: {"description": "Job not found"},
+        503: {"description": "The matching index is still being built"},
+        200: {"description": "Successful Response"},
+    },
+)
+async def match_developers(
+    id: str,
+    limit: int = Query(settings.MATCH_LIMIT_DEFAULT, ge=1, le=settings.MATCH_LIMIT_MAX),
+    projection: Optional[dict] = Depends(field_projection(DeveloperProfile)),
+):
+    """
+    Rank the developers whose skills best match those a job posting needs.
+
+    Developers are scored between 0 and 1 by the overlap of their skills with
+    the skills needed, rare skills counting for more than common ones.
+
+    Parameters:
+    - id (str): The ID of the job posting.
+    - limit (int): The number of developers to return.
+    - projection (dict): The fields selected with the `fields` query
+      parameter, the `summary` fields by default.
 
-        return opening_list
+    Returns:
+    - dict: The best matching developers first, each with its `score` and the
+      `matched_skills` it shares with the job posting.
+
+    Raises:
+    - HTTPException: If the job posting is not found, or the index is not
+      ready yet.
+    """
+    try:
+        job_object_id = ObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
+    if not skill_index.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="The matching index is still being built",
+            headers={"Retry-After": "5"},
+        )
+
+    try:
+        job = await db.Opening.find_one({"_id": job_object_id}, {"skills_needed": 1})
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        matches = skill_index.top_matches(
+            skill_index.developers, job.get("skills_needed"), limit
+        )
+        developers = await fetch_matches(
+            db.Developers,
+            matches,
+            projection or select_fields(DeveloperProfile, "summary"),
+        )
+        for developer in developers:
+            expose_id(developer)
+        return MongoJSONResponse(content={"status": "success", "data": developers})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -120,41 +465,72 @@ async def search_jobs(
         )
 
 
-@router.put(
-    "/update",
+_UPDATE_JOB_ROUTE = dict(
     response_description="Update a job posting",
-    response_model=OpeningUpdate,
+    response_model=OpeningOut,
     response_model_by_alias=False,
     responses={
         401: {"description": "Unauthorized"},
+        403: {"description": "Only companies can manage jobs"},
         200: {"description": "Job posting updated successfully"},
         404: {"description": "Job not found"},
+        409: {"description": "Job changed since the given version"},
         500: {"description": "Internal Server Error"},
     },
 )
-async def update_job(job_id: str, updated_job: Opening):
-    try:
-        # Convert job_id to ObjectId
-        job_object_id = ObjectId(job_id)
-        print(job_object_id)
-        # Check if the job exists
-        existing_job = db.Opening.find_one({"_id": job_object_id})
-        print("existing_job:", existing_job, updated_job.model_dump())
-        if not existing_job:
-            raise HTTPException(status_code=404, detail="Job not found")
 
-        updated_job = db.Opening.find_one_and_update(
-            {"_id": job_object_id},
-            {"$set": updated_job.model_dump()},
-            return_document=ReturnDocument.AFTER,
+
+# Registered once per method, so that each gets its own OpenAPI operation id.
+@router.put("/update", **_UPDATE_JOB_ROUTE)
+@router.patch("/update", **_UPDATE_JOB_ROUTE)
+async def update_job(
+    job_id: str,
+    updated_job: OpeningPatch,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Update a job posting of the company.
+
+    Parameters:
+    - job_id (str): The ID of the job posting.
+    - updated_job (OpeningPatch): The fields to change, and optionally the
+      `version` of the job posting they were based on.
+
+    Returns:
+    - OpeningOut: The updated job posting.
+
+    Raises:
+    - HTTPException: If the job posting is not found or belongs to another
+      company, or has changed since `version`.
+    """
+    company_id = _company_id(current_user)
+    try:
+        try:
+            job_object_id = ObjectId(job_id)
+        except Exception:
+            raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {job_id}")
+        update = build_update(updated_job)
+        # A missing job simply matches nothing, so no separate existence check.
+        updated_job = await apply_update(
+            db.Opening,
+            job_object_id,
+            update,
+            updated_job.version,
+            conditions={"company_id": company_id},
         )
+        if not updated_job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if update:
+            await response_cache.delete_prefix("jobs:")
+            skill_index.set_opening(
+                job_object_id,
+                updated_job.get("skills_needed"),
+                updated_job.get("status"),
+            )
 
-        print("updated_job---------------------", updated_job)
-        # Return the updated job
-        # updated_job_dict = {**existing_job, **updated_job.model_dump()}
-        if updated_job:
-            updated_job["_id"] = str(updated_job["_id"])  # Convert ObjectId to string
-            return updated_job
+        logger.info("Updated job opening %s", job_id)
+        updated_job["_id"] = str(updated_job["_id"])  # Convert ObjectId to string
+        return updated_job
 
     except HTTPException:
         # Re-raise HTTPException to keep the status code and detail intact
@@ -170,22 +546,32 @@ async def update_job(job_id: str, updated_job: Opening):
     response_model_by_alias=False,
     responses={
         401: {"description": "Unauthorized"},
+        403: {"description": "Only companies can manage jobs"},
+        404: {"description": "Job not found"},
         200: {"description": "Job posting deleted successfully"},
     },
 )
-async def delete_job(job_id: str):
+async def delete_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    company_id = _company_id(current_user)
     try:
         # Assuming db is your MongoDB connection object
         # and Opening is your MongoDB collection
         try:
             job_object_id = ObjectId(job_id)
         except Exception:
-            raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {id}")
-        deleted_job = db.Opening.find_one_and_delete({"_id": job_object_id})
-        if deleted_job:
-            deleted_job["_id"] = str(deleted_job["_id"])
-            return {"message": "Job posting deleted successfully", "job": deleted_job}
-        else:
+            raise HTTPException(status_code=404, detail=f"Invalid ObjectId: {job_id}")
+        # Openings of other companies match nothing, like missing ones.
+        deleted_job = await db.Opening.find_one_and_delete(
+            {"_id": job_object_id, "company_id": company_id}
+        )
+        if not deleted_job:
             raise HTTPException(status_code=404, detail="Job not found")
+        await response_cache.delete_prefix("jobs:")
+        skill_index.remove_opening(job_object_id)
+        deleted_job["_id"] = str(deleted_job["_id"])
+        deleted_job["company_id"] = str(deleted_job["company_id"])
+        return {"message": "Job posting deleted successfully", "job": deleted_job}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete job: {str(e)}")
@@ -1,8 +1,10 @@
+import logging
 from fastapi import APIRouter, Form, HTTPException, Depends
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
 from app.core.security import (
-    pwd_context,
+    verify_password,
+    get_password_hash,
     create_access_token,
     blacklist_token,
     verify_refresh_token,
@@ -10,17 +12,24 @@ from app.core.security import (
     generate_refresh_token,
 )
 from app.api.deps import oauth2_scheme, get_current_user
-from app.db.engine import db
+from app.core.ratelimit import limit_username
+from app.crud.user import (
+    create_user,
+    get_user_by_id,
+    get_user_by_login,
+    update_password,
+)
 from app.schemas.user import ResetPasswordInput
-from bson import ObjectId
 from jose import JWTError
 
 router = APIRouter()
 token_router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.post(
     "/register",
+    dependencies=[Depends(limit_username)],
     responses={
         200: {
             "description": "Successful Registration",
@@ -66,45 +75,31 @@ async def register_user(
     Raises:
         HTTPException: If failed to register the user.
     """
-    print("role----", role)
     if role not in ["company", "developer"]:
         raise HTTPException(status_code=422, detail="Invalid role")
-    existing_company_user = db.Company.find_one(
-        {"$or": [{"username": username}, {"email": email}]}
-    )
-    existing_developer_user = db.Developers.find_one(
-        {"$or": [{"username": username}, {"email": email}]}
-    )
-
-    if existing_company_user or existing_developer_user:
-        raise HTTPException(status_code=400, detail="Username or email already exists")
-    user_dict = {
-        "username": username,
-        "email": email,
-        "password": password,
-        "role": role,
-    }
-    user_dict["password"] = pwd_context.hash(user_dict["password"])
-
-    # Choose the collection based on the role
-    if role == "company":
-        result = db.Company.insert_one(user_dict)
-    elif role == "developer":
-        result = db.Developers.insert_one(user_dict)
+    hashed_password = await get_password_hash(password)
 
-    if result.acknowledged:
-        return JSONResponse(
-            status_code=200,
-            content={
-                "message": "User registered successfully",
-            },
-        )
-    else:
+    # The unique indexes on the users collection reject a taken username or
+    # email atomically, so there is no separate existence check to race with.
+    try:
+        user_id = await create_user(username, email, hashed_password, role)
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to register user")
 
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
+    logger.info("Registered %s user %s", role, user_id)
+    return JSONResponse(
+        status_code=200,
+        content={
+            "message": "User registered successfully",
+        },
+    )
+
 
 @router.post(
     "/token",
+    dependencies=[Depends(limit_username)],
     responses={
         200: {
             "description": "Successful Response",
@@ -142,15 +137,8 @@ async def login(username: str = Form(...), password: str = Form(...)) -> JSONRes
     Raises:
         HTTPException: If the provided credentials are invalid.
     """
-    user_in_company = db.Company.find_one(
-        {"$or": [{"username": username}, {"email": username}]}
-    )
-    user_in_developers = db.Developers.find_one(
-        {"$or": [{"username": username}, {"email": username}]}
-    )
-
-    user = user_in_company or user_in_developers
-    if user and pwd_context.verify(password, user["password"]):
+    user = await get_user_by_login(username)
+    if user and await verify_password(password, user["password"]):
         token_data = {
             "sub": str(user["_id"]),
             "username": user["username"],
@@ -175,8 +163,8 @@ async def logout(
     token: str = Depends(oauth2_scheme), refresh_token: str = Form(...)
 ) -> JSONResponse:
     try:
-        blacklist_token(refresh_token)
-        blacklist_token(token)
+        await blacklist_token(refresh_token)
+        await blacklist_token(token)
     except JWTError as e:
         if "Signature has expired" in str(e):
             return JSONResponse(
@@ -240,12 +228,9 @@ async def refresh_token(
     try:
         user_id = verify_refresh_token(refresh_token)
         if user_id:
-            user_in_company = db.Company.find_one({"_id": ObjectId(user_id)})
-            user_in_developers = db.Developers.find_one({"_id": ObjectId(user_id)})
-
-            user = user_in_company or user_in_developers
+            user = await get_user_by_id(user_id)
             if user:
-                blacklist_token(access_token)
+                await blacklist_token(access_token)
                 token_data = {
                     "sub": str(user["_id"]),
                     "username": user["username"],
@@ -284,25 +269,20 @@ async def reset_password(
         HTTPException: If the current password is incorrect.
     """
     user_id = current_user["sub"]
-    user_in_company = db.Company.find_one({"_id": ObjectId(user_id)})
-    user_in_developers = db.Developers.find_one({"_id": ObjectId(user_id)})
-    user = user_in_company or user_in_developers
+    user = await get_user_by_id(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
     # Verify the current password
-    if not pwd_context.verify(reset_password_input.current_password, user["password"]):
+    if not await verify_password(
+        reset_password_input.current_password, user["password"]
+    ):
         raise HTTPException(status_code=400, detail="Incorrect current password")
 
     # Hash the new password
-    new_password_hashed = pwd_context.hash(reset_password_input.new_password)
+    new_password_hashed = await get_password_hash(reset_password_input.new_password)
 
     # Update the user's password in the database
-    if user_in_company:
-        db.Company.update_one(
-            {"_id": ObjectId(user_id)}, {"$set": {"password": new_password_hashed}}
-        )
-    else:
-        db.Developers.update_one(
-            {"_id": ObjectId(user_id)}, {"$set": {"password": new_password_hashed}}
-        )
+    await update_password(user_id, new_password_hashed)
 
     return {"message": "Password has been reset successfully"}
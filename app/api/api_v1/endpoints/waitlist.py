@@ -1,34 +1,103 @@
-from fastapi import APIRouter, Form, HTTPException, Depends
+import asyncio
+import logging
+from fastapi import APIRouter, Form, HTTPException, Depends, Query
 from app.db.engine import db
-from app.api.deps import get_current_user
+from app.db.writebehind import QueueFull, acknowledge, waitlist_queue
+from app.core.responses import MongoJSONResponse
+from app.api.deps import get_current_user, Pagination
+from app.crud.pagination import fetch_page, stream_ndjson
+from app.crud.export import ExportFormat, stream_export
+from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.post("/submit/{email}")
 async def submit_waitlist_email(email: str):
-    print(f"Received waitlist email: {email}")
+    logger.debug("Received waitlist email %s", email)
+    email = email.strip().lower()
+    document = {"email": email}
     try:
-        result = db.waitlist.insert_one({"email": email})
-        if result.inserted_id:
-            return {
-                "message": "Waitlist email submitted successfully",
-                "email_id": str(result.inserted_id),
-            }
-        else:
-            raise HTTPException(
-                status_code=500, detail="Waitlist email submission failed"
-            )
-    except Exception as e:
-        return {"error": str(e)}
+        # Written in a batch; the same email submitted again while pending
+        # shares the first submission.
+        inserted = await acknowledge(waitlist_queue.submit(document, key=email))
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+    except asyncio.TimeoutError:
+        # Still queued, and written once the database catches up.
+        return MongoJSONResponse(
+            status_code=202,
+            content={
+                "message": "Waitlist email accepted",
+                "email_id": str(document["_id"]),
+            },
+        )
+
+    if inserted is None:
+        raise HTTPException(status_code=500, detail="Waitlist email submission failed")
+    if not inserted:
+        return {"message": "Email is already on the waitlist"}
+    return {
+        "message": "Waitlist email submitted successfully",
+        "email_id": str(document["_id"]),
+    }
+
+
+def _waitlist_entry(document: dict) -> dict:
+    return {"email": document.get("email")}
 
 
 @router.get("/list")
-async def list_waitlist_emails(current_user: dict = Depends(get_current_user)):
+async def list_waitlist_emails(
+    page: Pagination = Depends(), current_user: dict = Depends(get_current_user)
+):
+    query, projection = {}, {"email": 1}
     try:
-        waitlist_emails = list(db.waitlist.find({}, {"_id": 0, "email": 1}))
-        return {"waitlist_emails": waitlist_emails}
+        if page.stream:
+            return stream_ndjson(
+                db.waitlist, query, projection, page.after, page.limit, _waitlist_entry
+            )
+
+        waitlist_emails, next_cursor = await fetch_page(
+            db.waitlist, query, projection, page.after, page.limit, _waitlist_entry
+        )
+        return {"waitlist_emails": waitlist_emails, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error listing waitlist emails: {str(e)}"
         )
+
+
+@router.get("/export")
+async def export_waitlist_emails(
+    format: ExportFormat = Query(ExportFormat.csv, description="Format of the file"),
+    since: Optional[datetime] = Query(
+        None, description="Only export the emails submitted since this time"
+    ),
+    gzip: bool = Query(False, description="Gzip the file"),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Download every email as a CSV or NDJSON file.
+
+    The file is streamed a batch at a time, so exports of any size start
+    right away and use constant memory. Rows are ordered by submission time.
+
+    Parameters:
+    - format (ExportFormat): `csv` or `ndjson`.
+    - since (datetime): Only export the emails submitted since this time.
+    - gzip (bool): Gzip the file.
+
+    Returns:
+    - StreamingResponse: The file, with the `id`, `email` and
+      `created_at` of every email.
+    """
+    return stream_export(db.waitlist, ["email"], format, "waitlist", since, gzip)
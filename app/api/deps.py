@@ -1,16 +1,25 @@
+import logging
+from typing import Optional
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from app.core.config import settings
-from jose import jwt, JWTError
+from jose import JWTError
 from app.db.engine import db
+from app.core.revocation import revocation_cache, token_digest
+from app.core.security import claims_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/user/token")
+logger = logging.getLogger(__name__)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Retrieves the current user based on the provided token.
 
+    FastAPI resolves a dependency once per request, so declaring it both on a
+    router and on one of its routes still verifies the token only once. The
+    claims of a token are cached until it expires.
+
     Parameters:
     - token (str): The authentication token.
 
@@ -20,7 +29,11 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
     Raises:
     - HTTPException: If the credentials cannot be validated.
     """
-    if db.blocklist.find_one({"token": token}):
+    token_hash = token_digest(token)
+    revoked = revocation_cache.is_revoked(token_hash)
+    if revoked is None:
+        revoked = await db.blocklist.find_one({"token_hash": token_hash}) is not None
+    if revoked:
         raise HTTPException(
             status_code=401,
             detail="Token has been revoked",
@@ -32,11 +45,38 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        return payload
+        return claims_cache.verify(token, token_hash)
 
     except JWTError as e:
-        print(e)
+        logger.debug("Rejected token: %s", e)
         raise credentials_exception
+
+
+class Pagination:
+    """
+    Query parameters shared by the paginated list endpoints.
+
+    Parameters:
+    - after (str): The `next_cursor` returned by the previous page.
+    - limit (int): The page size, capped at `settings.PAGE_SIZE_MAX`.
+    - stream (bool): Stream every matching document as NDJSON instead.
+    """
+
+    def __init__(
+        self,
+        after: Optional[str] = Query(
+            None, description="Cursor returned as next_cursor by the previous page"
+        ),
+        limit: Optional[int] = Query(
+            None,
+            ge=1,
+            le=settings.PAGE_SIZE_MAX,
+            description="Number of documents per page",
+        ),
+        stream: bool = Query(
+            False, description="Stream all matching documents as NDJSON"
+        ),
+    ):
+        self.after = after
+        self.limit = limit
+        self.stream = stream
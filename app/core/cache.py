@@ -0,0 +1,120 @@
+"""
+cache.py
+
+This module contains the response cache used by the read-heavy profile and
+job endpoints, and the helpers answering conditional requests with ETags.
+
+The default backend is an in-process LRU with a TTL. Writes invalidate the
+entries of the worker that handled them; other workers see the change once
+their copy expires, after at most `RESPONSE_CACHE_TTL_SECONDS`. A shared
+backend can be plugged in by implementing `CacheBackend`.
+"""
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: dict
+
+
+class CacheBackend(ABC):
+    """
+    Interface of the response cache backends.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: CachedResponse):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class LocalCache(CacheBackend):
+    """
+    In-process LRU cache whose entries expire `ttl` seconds after being set.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key: str, value: CachedResponse):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def delete_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache: CacheBackend = LocalCache(
+    settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL_SECONDS
+)
+
+
+def cached_response(body: bytes, headers: Optional[dict] = None) -> CachedResponse:
+    """
+    Wrap a serialized JSON body with its ETag, ready to be cached.
+    """
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+    return CachedResponse(body, etag, headers or {})
+
+
+def conditional_response(request: Request, cached: CachedResponse) -> Response:
+    """
+    Build the response for `cached`, or an empty 304 response if the client
+    already holds the same representation.
+    """
+    headers = {**cached.headers, "ETag": cached.etag}
+    # Weak comparison: compressed responses carry the ETag as a weak one.
+    if_none_match = [
+        tag.strip().removeprefix("W/")
+        for tag in request.headers.get("if-none-match", "").split(",")
+    ]
+    if cached.etag.removeprefix("W/") in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
@@ -6,7 +6,7 @@ This module contains the configuration settings for the application, including A
 """
 import os
 from dotenv import load_dotenv
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 
 from pydantic import AnyHttpUrl, EmailStr, HttpUrl, PostgresDsn, validator
 from pydantic_settings import BaseSettings
@@ -41,6 +41,108 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URI: str = os.environ.get("MONGODB_URI")
     MONGODB_NAME: str = os.environ.get("MONGODB_NAME")
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    # How long an operation may wait for a free connection before failing
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 2_000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
+    MONGODB_READ_PREFERENCE: str = "primary"
+    # Write concern applied to every write: "majority" or a number of nodes
+    MONGODB_WRITE_CONCERN: str = "majority"
+    # The health reported on / is refreshed in the background at this interval
+    MONGODB_HEALTH_CHECK_SECONDS: int = 10
+
+    # Pagination: list endpoints return at most PAGE_SIZE_MAX documents per page
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+    # Exports read and send the documents EXPORT_BATCH_SIZE at a time
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Revoked tokens are cached in memory and synced from the blocklist
+    REVOCATION_CACHE_SIZE: int = 100_000
+    REVOCATION_SYNC_SECONDS: int = 5
+
+    # Token signing keys by key id, given as JSON, e.g. '{"2024-06": "..."}'.
+    # New tokens are signed with JWT_SIGNING_KEY_ID and name it in their `kid`
+    # header; tokens without `kid` are verified with SECRET_KEY. To rotate,
+    # add the new key, sign with it, and drop the old one once its tokens
+    # have expired
+    JWT_KEYS: Dict[str, str] = {}
+    JWT_SIGNING_KEY_ID: Optional[str] = None
+    # The claims of verified tokens are cached per worker until they expire
+    TOKEN_CACHE_SIZE: int = 10_000
+
+    # bcrypt runs on PASSWORD_HASH_WORKERS threads; further requests queue up
+    # to PASSWORD_HASH_QUEUE_SIZE and are rejected with a 503 beyond that
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+
+    # Token bucket rate limits per client IP, as "<requests>/<seconds>" keyed
+    # by path prefix; login and registration are also limited per username by
+    # RATE_LIMIT_USERNAME. Buckets are kept for RATE_LIMIT_MAX_KEYS clients
+    RATE_LIMITS: Dict[str, str] = {
+        "/api/v1/user/token": "10/60",
+        "/api/v1/user/register": "5/60",
+        "/api/v1/waitlist/submit": "5/60",
+        "/api/v1/contact/submit": "5/60",
+    }
+    RATE_LIMIT_USERNAME: str = "10/60"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # Requests beyond MAX_IN_FLIGHT_REQUESTS at once are shed with a 503
+    MAX_IN_FLIGHT_REQUESTS: int = 200
+
+    # Waitlist and contact submissions are inserted in batches of up to
+    # WRITE_BEHIND_BATCH_SIZE, at least every WRITE_BEHIND_INTERVAL_MS. With
+    # the "flush" ack mode a submission is answered once written, with
+    # "accept" once queued, at the risk of losing it if the worker crashes
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_INTERVAL_MS: int = 50
+    WRITE_BEHIND_MAX_PENDING: int = 50_000
+    WRITE_BEHIND_ACK: Literal["flush", "accept"] = "flush"
+    WRITE_BEHIND_ACK_TIMEOUT_SECONDS: float = 5
+
+    # Profile and job reads are cached per worker for RESPONSE_CACHE_TTL_SECONDS
+    RESPONSE_CACHE_SIZE: int = 10_000
+    RESPONSE_CACHE_TTL_SECONDS: int = 30
+
+    # Bulk job endpoints accept at most JOB_BULK_MAX_SIZE openings per request
+    JOB_BULK_MAX_SIZE: int = 500
+
+    # The skill matching index is rebuilt from the database at this interval;
+    # writes handled by a worker update its index in between
+    SKILL_INDEX_REFRESH_SECONDS: int = 300
+    MATCH_LIMIT_DEFAULT: int = 20
+    MATCH_LIMIT_MAX: int = 100
+
+    # Responses of COMPRESSION_MEDIA_TYPES are compressed with Brotli or gzip
+    # from COMPRESSION_MIN_SIZE bytes; streamed responses are compressed chunk
+    # by chunk with COMPRESSION_STREAMING, or else sent as they are
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_MEDIA_TYPES: List[str] = [
+        "application/json",
+        "application/x-ndjson",
+        "text/csv",
+        "text/html",
+        "text/plain",
+    ]
+    COMPRESSION_STREAMING: bool = True
+
+    # /metrics is served to the clients of METRICS_ALLOWED_NETWORKS, given as
+    # JSON, e.g. '["10.0.0.0/8"]', and to requests with the bearer token
+    # METRICS_TOKEN; it is refused to everyone else, and to everyone when
+    # neither is set. Behind a proxy, the client is only known with uvicorn's
+    # --proxy-headers, else every request comes from the proxy
+    METRICS_ALLOWED_NETWORKS: List[str] = []
+    METRICS_TOKEN: Optional[str] = None
+
+    # Logging: LOG_LEVELS overrides the level of individual loggers, given as
+    # JSON, e.g. '{"app.api": "DEBUG", "pymongo": "WARNING"}'. Debug records
+    # carry payloads, so only a LOG_DEBUG_SAMPLE_RATE fraction of them is kept
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,319 @@
+"""
+matching.py
+
+This module contains the skill matching engine that ranks developers for a job
+opening and job openings for a developer.
+
+Skills are normalized (case, spacing and common aliases) into one vocabulary,
+and every worker keeps an inverted index from each skill to the developers
+and the active openings that list it. Ranking a query only visits the
+candidates sharing at least one skill with it, and scores them by weighted
+Jaccard similarity: the weight of the shared skills over the weight of all
+the skills of either side, a skill weighing more the rarer it is.
+
+The index is rebuilt from the database every `SKILL_INDEX_REFRESH_SECONDS`,
+which also refreshes the skill weights, and the writes handled by a worker
+update its copy as they happen; writes handled by other workers are picked
+up by the next rebuild. The writes made while a rebuild reads the database
+are replayed on the rebuilt index, so that they are not lost when it
+replaces the current one.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import re
+from typing import Iterable, Optional
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.db.engine import db
+
+logger = logging.getLogger(__name__)
+
+# Spellings of the same skill, after lowercasing and collapsing whitespace.
+SKILL_ALIASES = {
+    "js": "javascript",
+    "ecmascript": "javascript",
+    "ts": "typescript",
+    "golang": "go",
+    "py": "python",
+    "python3": "python",
+    "node": "node.js",
+    "nodejs": "node.js",
+    "reactjs": "react",
+    "react.js": "react",
+    "vuejs": "vue",
+    "vue.js": "vue",
+    "postgres": "postgresql",
+    "mongo": "mongodb",
+    "k8s": "kubernetes",
+    "c sharp": "c#",
+    "csharp": "c#",
+    "cpp": "c++",
+}
+
+
+def normalize_skill(skill: str) -> str:
+    """
+    Return the canonical form of `skill`.
+    """
+    skill = re.sub(r"\s+", " ", skill.strip().lower())
+    return SKILL_ALIASES.get(skill, skill)
+
+
+def normalize_skills(skills: Optional[Iterable]) -> frozenset:
+    """
+    Return the canonical forms of `skills`, ignoring anything but strings.
+    """
+    return frozenset(
+        normalize_skill(skill)
+        for skill in skills or ()
+        if isinstance(skill, str) and skill.strip()
+    )
+
+
+class _Postings:
+    """
+    The skills of a set of documents, their total weight, and the documents
+    listing each skill.
+    """
+
+    def __init__(self):
+        self.skills: dict[ObjectId, frozenset] = {}
+        self.weights: dict[ObjectId, float] = {}
+        self.postings: dict[str, set[ObjectId]] = {}
+
+    def set(self, doc_id: ObjectId, skills: frozenset, weight: float):
+        self.remove(doc_id)
+        if not skills:
+            return
+        self.skills[doc_id] = skills
+        self.weights[doc_id] = weight
+        for skill in skills:
+            self.postings.setdefault(skill, set()).add(doc_id)
+
+    def remove(self, doc_id: ObjectId):
+        self.weights.pop(doc_id, None)
+        for skill in self.skills.pop(doc_id, ()):
+            posting = self.postings[skill]
+            posting.discard(doc_id)
+            if not posting:
+                del self.postings[skill]
+
+
+class SkillIndex:
+    def __init__(self):
+        self.developers = _Postings()
+        self.openings = _Postings()
+        self._weights: dict[str, float] = {}
+        self._default_weight = 1.0
+        # The writes made during a rebuild, as (method, args).
+        self._changes: Optional[list] = None
+        self.ready = False
+
+    def _record(self, method, *args):
+        if self._changes is not None:
+            self._changes.append((method, args))
+
+    def _weight(self, skill: str) -> float:
+        return self._weights.get(skill, self._default_weight)
+
+    def _set(self, postings: _Postings, doc_id: ObjectId, skills: Optional[Iterable]):
+        skills = normalize_skills(skills)
+        postings.set(doc_id, skills, sum(self._weight(skill) for skill in skills))
+
+    def _refresh_weights(self):
+        # Inverse document frequency over developers and openings together,
+        # so that both directions of matching agree on the weights.
+        total = len(self.developers.skills) + len(self.openings.skills)
+        frequencies = {}
+        for postings in (self.developers.postings, self.openings.postings):
+            for skill, ids in postings.items():
+                frequencies[skill] = frequencies.get(skill, 0) + len(ids)
+        self._weights = {
+            skill: math.log(1 + total / frequency)
+            for skill, frequency in frequencies.items()
+        }
+        # Skills first seen after this count as the rarest ones.
+        self._default_weight = math.log(1 + max(total, 1))
+        for postings in (self.developers, self.openings):
+            postings.weights = {
+                doc_id: sum(self._weights[skill] for skill in skills)
+                for doc_id, skills in postings.skills.items()
+            }
+
+    def set_developer(self, developer_id: ObjectId, skills: Optional[Iterable]):
+        self._record(self.set_developer, developer_id, skills)
+        self._set(self.developers, developer_id, skills)
+
+    def remove_developer(self, developer_id: ObjectId):
+        self._record(self.remove_developer, developer_id)
+        self.developers.remove(developer_id)
+
+    def set_opening(
+        self,
+        opening_id: ObjectId,
+        skills: Optional[Iterable],
+        status: Optional[str] = "active",
+    ):
+        """
+        Index an opening, or drop it from the index if it is not active.
+        """
+        self._record(self.set_opening, opening_id, skills, status)
+        if status in (None, "active"):
+            self._set(self.openings, opening_id, skills)
+        else:
+            self.openings.remove(opening_id)
+
+    def remove_opening(self, opening_id: ObjectId):
+        self._record(self.remove_opening, opening_id)
+        self.openings.remove(opening_id)
+
+    async def refresh_openings(self, opening_ids: list[ObjectId]):
+        """
+        Reindex openings from their stored skills and status, dropping the
+        ones that no longer exist.
+        """
+        found = set()
+        cursor = db.Opening.find(
+            {"_id": {"$in": opening_ids}}, {"skills_needed": 1, "status": 1}
+        )
+        async for opening in cursor:
+            found.add(opening["_id"])
+            self.set_opening(
+                opening["_id"], opening.get("skills_needed"), opening.get("status")
+            )
+        for opening_id in set(opening_ids) - found:
+            self.remove_opening(opening_id)
+
+    def top_matches(
+        self,
+        postings: _Postings,
+        skills: Optional[Iterable],
+        limit: int,
+    ) -> list[tuple[ObjectId, float, list[str]]]:
+        """
+        Rank the documents of `postings` by skill similarity with `skills`.
+
+        Parameters:
+        - postings (_Postings): `developers` or `openings`.
+        - skills (Iterable): The skills to match, in any spelling.
+        - limit (int): The number of documents to return.
+
+        Returns:
+        - list: Up to `limit` tuples of the id of a document, its score
+          between 0 and 1, and the skills it shares with the query, best
+          match first.
+        """
+        query = normalize_skills(skills)
+        if not query:
+            return []
+
+        # Weighted Jaccard: shared weight over the weight of the union.
+        weight = self._weight
+        weights = postings.weights
+        query_weight = sum(weight(skill) for skill in query)
+
+        # The rarest skills, with the shortest posting lists, go first. A
+        # document only sharing the skills left scores at most their weight
+        # over the weight of the query, so the posting lists of the most
+        # common skills are skipped once that cannot beat the top `limit`.
+        remaining = query_weight
+        seen = set()
+        best: list[tuple[float, ObjectId]] = []
+        for skill in sorted(query, key=weight, reverse=True):
+            if len(best) == limit and remaining / query_weight <= best[0][0]:
+                break
+            remaining -= weight(skill)
+            for doc_id in postings.postings.get(skill, ()):
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                intersection = sum(map(weight, query & postings.skills[doc_id]))
+                score = intersection / (query_weight + weights[doc_id] - intersection)
+                if len(best) < limit:
+                    heapq.heappush(best, (score, doc_id))
+                elif score > best[0][0]:
+                    heapq.heapreplace(best, (score, doc_id))
+
+        best.sort(reverse=True)
+        return [
+            (
+                doc_id,
+                round(score, 4),
+                sorted(query & postings.skills[doc_id]),
+            )
+            for score, doc_id in best
+        ]
+
+    async def rebuild(self):
+        """
+        Rebuild the index and the skill weights from the database.
+        """
+        # Document weights are filled in by _refresh_weights.
+        developers, openings = _Postings(), _Postings()
+        self._changes = []
+        try:
+            async for profile in db.Developers.find(
+                {"skills.0": {"$exists": True}}, {"skills": 1}
+            ):
+                skills = normalize_skills(profile.get("skills"))
+                developers.set(profile["_id"], skills, 0)
+            async for opening in db.Opening.find(
+                {"status": {"$in": ["active", None]}}, {"skills_needed": 1}
+            ):
+                skills = normalize_skills(opening.get("skills_needed"))
+                openings.set(opening["_id"], skills, 0)
+        finally:
+            changes, self._changes = self._changes, None
+
+        # The writes made meanwhile may not have been read, and nothing can
+        # run between the swap and their replay.
+        self.developers, self.openings = developers, openings
+        for method, args in changes:
+            method(*args)
+        self._refresh_weights()
+        self.ready = True
+
+
+skill_index = SkillIndex()
+
+
+async def fetch_matches(
+    collection, matches: list[tuple[ObjectId, float, list[str]]], projection: dict
+) -> list[dict]:
+    """
+    Read the documents ranked by `SkillIndex.top_matches` in one query.
+
+    Parameters:
+    - collection: The collection holding the documents.
+    - matches (list): The ranking returned by `top_matches`.
+    - projection (dict): The fields to return.
+
+    Returns:
+    - list: The documents in rank order, with their `score` and
+      `matched_skills`. Documents deleted since they were indexed are left out.
+    """
+    cursor = collection.find({"_id": {"$in": [m[0] for m in matches]}}, projection)
+    documents = {document["_id"]: document async for document in cursor}
+    ranked = []
+    for doc_id, score, skills in matches:
+        if (document := documents.get(doc_id)) is not None:
+            document.update(score=score, matched_skills=skills)
+            ranked.append(document)
+    return ranked
+
+
+async def rebuild_skill_index_periodically():
+    """
+    Rebuild `skill_index` until cancelled.
+    """
+    while True:
+        try:
+            await skill_index.rebuild()
+        except PyMongoError as e:
+            logger.warning("Could not rebuild the skill index: %s", e)
+        await asyncio.sleep(settings.SKILL_INDEX_REFRESH_SECONDS)
@@ -0,0 +1,344 @@
+"""
+metrics.py
+
+This module contains the Prometheus instrumentation of the API: a middleware
+recording per-route request counts, latency, response sizes, in-flight
+requests and the time each request spent in MongoDB, and a collector exposing
+the statistics kept by the database listeners, the password hash pool, the
+response cache and the response compression. Everything is served in the
+Prometheus text format on `/metrics`, to the clients of
+`METRICS_ALLOWED_NETWORKS` and to the holders of `METRICS_TOKEN` only.
+
+Metrics are kept per worker process; Prometheus should scrape every worker.
+"""
+import hmac
+import ipaddress
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.core.compression import compression_stats
+from app.core.ratelimit import rate_limiter
+from app.db.writebehind import write_behind_queues
+from app.core.security import claims_cache, password_hash_pool
+from app.db.monitoring import command_metrics, pool_metrics, request_db_time
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests handled.",
+    ["method", "route", "status"],
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ["method", "route"],
+)
+DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Time spent in MongoDB commands while handling HTTP requests.",
+    ["method", "route"],
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of HTTP response bodies.",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled.")
+
+
+def _route(scope: Scope) -> str:
+    # The path template keeps the number of label values bounded.
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the request metrics of every HTTP request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+        db_time = [0.0]
+        token = request_db_time.set(db_time)
+
+        async def send_wrapper(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            request_db_time.reset(token)
+
+            method, route = scope["method"], _route(scope)
+            REQUESTS.labels(method, route, str(status)).inc()
+            LATENCY.labels(method, route).observe(elapsed)
+            DB_TIME.labels(method, route).observe(db_time[0])
+            RESPONSE_SIZE.labels(method, route).observe(size)
+
+
+class StatsCollector:
+    """
+    Exposes the statistics kept outside of prometheus_client as metrics.
+    """
+
+    def collect(self):
+        commands = CounterMetricFamily(
+            "mongodb_commands",
+            "MongoDB commands run.",
+            labels=["collection", "command"],
+        )
+        command_failures = CounterMetricFamily(
+            "mongodb_command_failures",
+            "MongoDB commands that failed.",
+            labels=["collection", "command"],
+        )
+        command_seconds = CounterMetricFamily(
+            "mongodb_command_seconds",
+            "Time spent in MongoDB commands.",
+            labels=["collection", "command"],
+        )
+        for name, stats in command_metrics.stats().items():
+            labels = name.split(".", 1)
+            commands.add_metric(labels, stats["count"])
+            command_failures.add_metric(labels, stats["failures"])
+            command_seconds.add_metric(labels, stats["total_seconds"])
+        yield commands
+        yield command_failures
+        yield command_seconds
+
+        pool = pool_metrics.stats()
+        yield CounterMetricFamily(
+            "mongodb_pool_checkouts",
+            "Connections checked out of the pool.",
+            value=pool["checkout"]["count"],
+        )
+        yield CounterMetricFamily(
+            "mongodb_pool_checkout_wait_seconds",
+            "Time spent waiting to check connections out of the pool.",
+            value=pool["checkout"]["total_seconds"],
+        )
+        checkout_failures = CounterMetricFamily(
+            "mongodb_pool_checkout_failures",
+            "Connection check-outs that failed.",
+            labels=["reason"],
+        )
+        for reason, count in pool["checkout_failures"].items():
+            checkout_failures.add_metric([reason], count)
+        yield checkout_failures
+        yield GaugeMetricFamily(
+            "mongodb_pool_connections_in_use",
+            "Connections checked out of the pool.",
+            value=pool["in_use"],
+        )
+        yield GaugeMetricFamily(
+            "mongodb_pool_connections_open",
+            "Connections open in the pool.",
+            value=pool["open"],
+        )
+
+        hashing = password_hash_pool.stats()
+        yield GaugeMetricFamily(
+            "password_hash_queue_depth",
+            "Password hashes waiting for a worker.",
+            value=hashing["queue_depth"],
+        )
+        yield GaugeMetricFamily(
+            "password_hash_in_flight",
+            "Password hashes being computed.",
+            value=hashing["in_flight"],
+        )
+        yield CounterMetricFamily(
+            "password_hashes",
+            "Password hashes computed.",
+            value=hashing["completed"],
+        )
+        yield CounterMetricFamily(
+            "password_hash_seconds",
+            "Time spent computing password hashes, queueing included.",
+            value=hashing["total_seconds"],
+        )
+        yield CounterMetricFamily(
+            "password_hash_rejections",
+            "Password hashes rejected because the queue was full.",
+            value=hashing["rejected"],
+        )
+
+        cache = response_cache.stats()
+        yield CounterMetricFamily(
+            "response_cache_hits", "Response cache hits.", value=cache["hits"]
+        )
+        yield CounterMetricFamily(
+            "response_cache_misses", "Response cache misses.", value=cache["misses"]
+        )
+        yield GaugeMetricFamily(
+            "response_cache_entries", "Responses cached.", value=cache["size"]
+        )
+
+        compressed = CounterMetricFamily(
+            "http_compressed_responses",
+            "Responses compressed.",
+            labels=["encoding"],
+        )
+        bytes_in = CounterMetricFamily(
+            "http_compression_input_bytes",
+            "Bytes of response bodies before compression.",
+            labels=["encoding"],
+        )
+        bytes_out = CounterMetricFamily(
+            "http_compression_output_bytes",
+            "Bytes of response bodies after compression.",
+            labels=["encoding"],
+        )
+        cpu_seconds = CounterMetricFamily(
+            "http_compression_cpu_seconds",
+            "CPU time spent compressing response bodies.",
+            labels=["encoding"],
+        )
+        ratio = GaugeMetricFamily(
+            "http_compression_ratio",
+            "Compressed size over uncompressed size of the response bodies.",
+            labels=["encoding"],
+        )
+        for encoding, stats in compression_stats.items():
+            compressed.add_metric([encoding], stats["responses"])
+            bytes_in.add_metric([encoding], stats["bytes_in"])
+            bytes_out.add_metric([encoding], stats["bytes_out"])
+            cpu_seconds.add_metric([encoding], stats["cpu_seconds"])
+            if stats["bytes_in"]:
+                ratio.add_metric([encoding], stats["bytes_out"] / stats["bytes_in"])
+        yield compressed
+        yield bytes_in
+        yield bytes_out
+        yield cpu_seconds
+        yield ratio
+
+        tokens = claims_cache.stats()
+        yield CounterMetricFamily(
+            "token_cache_hits",
+            "Token verifications served from the cache.",
+            value=tokens["hits"],
+        )
+        yield CounterMetricFamily(
+            "token_cache_misses", "Tokens verified.", value=tokens["misses"]
+        )
+        yield GaugeMetricFamily(
+            "token_cache_entries", "Verified tokens cached.", value=tokens["size"]
+        )
+
+        limits = rate_limiter.stats()
+        yield CounterMetricFamily(
+            "rate_limited_requests",
+            "Requests rejected with a 429 by the rate limits.",
+            value=limits["limited"],
+        )
+        yield CounterMetricFamily(
+            "shed_requests",
+            "Requests rejected with a 503 beyond the in-flight limit.",
+            value=limits["shed"],
+        )
+        yield GaugeMetricFamily(
+            "rate_limit_buckets", "Rate limit buckets kept.", value=limits["size"]
+        )
+
+        pending = GaugeMetricFamily(
+            "write_behind_pending", "Documents waiting to be written.", labels=["queue"]
+        )
+        written = CounterMetricFamily(
+            "write_behind_written", "Documents inserted.", labels=["queue"]
+        )
+        duplicates = CounterMetricFamily(
+            "write_behind_duplicates",
+            "Documents rejected as duplicates.",
+            labels=["queue"],
+        )
+        failed = CounterMetricFamily(
+            "write_behind_failed",
+            "Documents rejected by the database.",
+            labels=["queue"],
+        )
+        batches = CounterMetricFamily(
+            "write_behind_batches", "Batches written.", labels=["queue"]
+        )
+        for queue in write_behind_queues:
+            stats = queue.stats()
+            pending.add_metric([queue.collection_name], stats["pending"])
+            written.add_metric([queue.collection_name], stats["written"])
+            duplicates.add_metric([queue.collection_name], stats["duplicates"])
+            failed.add_metric([queue.collection_name], stats["failed"])
+            batches.add_metric([queue.collection_name], stats["batches"])
+        yield pending
+        yield written
+        yield duplicates
+        yield failed
+        yield batches
+
+
+REGISTRY.register(StatsCollector())
+
+
+_METRICS_NETWORKS = [
+    ipaddress.ip_network(network, strict=False)
+    for network in settings.METRICS_ALLOWED_NETWORKS
+]
+
+
+def metrics_allowed(request: Request) -> bool:
+    """
+    Return whether `request` comes from an allowed network or carries the
+    metrics token.
+    """
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(
+            token.encode(), settings.METRICS_TOKEN.encode()
+        ):
+            return True
+    try:
+        client = ipaddress.ip_address(request.client.host)
+    except (AttributeError, ValueError):
+        return False
+    return any(client in network for network in _METRICS_NETWORKS)
+
+
+async def metrics(request: Request) -> Response:
+    """
+    Serve the metrics in the Prometheus text format, or a 403 if the client
+    is not allowed to read them.
+    """
+    if not metrics_allowed(request):
+        return Response("Forbidden", status_code=403)
+    return Response(
+        generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
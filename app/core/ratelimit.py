@@ -0,0 +1,226 @@
+"""
+ratelimit.py
+
+This module contains the rate limiter protecting the unauthenticated
+endpoints, and the global limit on the number of requests in flight.
+
+Rate limits are token buckets: a client may send `burst` requests at once,
+after which it regains one request every `seconds / burst` seconds. Every
+endpoint listed in `RATE_LIMITS` has its own bucket per client IP, checked by
+`RateLimitMiddleware` before the request is parsed, and `limit_username` adds
+a bucket per username to the endpoints taking one, so that a password
+guessing run spread over many addresses is limited too. A limited request is
+rejected with a 429 and a `Retry-After` header.
+
+The default backend keeps the buckets in process, so each worker enforces the
+limits on its own share of the traffic; a backend shared by the workers can
+be plugged in by implementing `RateLimitBackend`.
+
+Beyond `MAX_IN_FLIGHT_REQUESTS` concurrent requests, further ones are shed
+with a 503 before doing any work, instead of queueing for the event loop and
+the connection pool until they all time out.
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from fastapi import Form, HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Paths never rate limited or shed, so that the service can still be
+# monitored while it is overloaded.
+EXEMPT_PATHS = {"/", "/metrics"}
+
+
+class RateLimit(NamedTuple):
+    burst: int
+    seconds: float
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """
+        Parse a limit written as "<requests>/<seconds>", e.g. "10/60".
+        """
+        burst, seconds = value.split("/")
+        return cls(int(burst), float(seconds))
+
+
+class RateLimitBackend(ABC):
+    """
+    Interface of the rate limit backends.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, limit: RateLimit) -> float:
+        """
+        Take a token from the bucket `key`.
+
+        Returns:
+        - float: 0 if the request is allowed, or else the number of seconds
+          until the bucket has a token again.
+        """
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets, keeping the `max_keys` most recently used ones.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        rate = limit.burst / limit.seconds
+        tokens, updated_at = self._buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated_at) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            # The least recently used bucket is the likeliest to be full.
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        return {"size": len(self._buckets)}
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        limits: dict[str, str],
+        username_limit: str,
+        max_in_flight: int,
+    ):
+        self.backend = backend
+        # Longest prefix first, so that the most specific limit applies.
+        self.limits = sorted(
+            ((path, RateLimit.parse(limit)) for path, limit in limits.items()),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.username_limit = RateLimit.parse(username_limit)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.limited = 0
+        self.shed = 0
+
+    def limit_for(self, path: str) -> Optional[tuple[str, RateLimit]]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return prefix, limit
+        return None
+
+    async def check(self, key: str, limit: RateLimit) -> Optional[int]:
+        """
+        Take a token from the bucket `key`.
+
+        Returns:
+        - int: None if the request is allowed, or else the number of seconds
+          the client should wait before retrying.
+        """
+        wait = await self.backend.take(key, limit)
+        if not wait:
+            return None
+        self.limited += 1
+        return math.ceil(wait)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "limited": self.limited,
+            "shed": self.shed,
+            **self.backend.stats(),
+        }
+
+
+rate_limiter = RateLimiter(
+    LocalRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS),
+    settings.RATE_LIMITS,
+    settings.RATE_LIMIT_USERNAME,
+    settings.MAX_IN_FLIGHT_REQUESTS,
+)
+
+
+def _too_many_requests(retry_after: int) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Too many requests, please try again later"},
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware shedding requests beyond the in-flight limit, and
+    applying the per-IP rate limits of `RATE_LIMITS`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if rate_limiter.in_flight >= rate_limiter.max_in_flight:
+            rate_limiter.shed += 1
+            response = JSONResponse(
+                {"detail": "Server is busy, please try again"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        rate_limiter.in_flight += 1
+        try:
+            matched = rate_limiter.limit_for(scope["path"])
+            if matched is not None:
+                # Behind a proxy, uvicorn's --proxy-headers sets the client
+                # from X-Forwarded-For.
+                client = scope["client"][0] if scope.get("client") else "unknown"
+                prefix, limit = matched
+                retry_after = await rate_limiter.check(f"ip:{prefix}:{client}", limit)
+                if retry_after is not None:
+                    await _too_many_requests(retry_after)(scope, receive, send)
+                    return
+
+            await self.app(scope, receive, send)
+        finally:
+            rate_limiter.in_flight -= 1
+
+
+async def limit_username(username: str = Form(...)):
+    """
+    Apply `RATE_LIMIT_USERNAME` to the username sent with the request.
+
+    Raises:
+    - HTTPException: If the username has used up its requests.
+    """
+    key = f"username:{username.strip().lower()}"
+    retry_after = await rate_limiter.check(key, rate_limiter.username_limit)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts for this user, please try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
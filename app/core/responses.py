@@ -0,0 +1,32 @@
+"""
+responses.py
+
+This module contains the JSON response class used by the whole API.
+
+It serializes with orjson, which handles datetimes and enums natively and is
+taught ObjectId here, so documents read from MongoDB can be rendered as they
+are instead of first being copied to convert their ids to strings.
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize `content` to JSON, converting ObjectIds to strings.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
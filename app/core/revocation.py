@@ -0,0 +1,144 @@
+"""
+revocation.py
+
+This module contains the in-memory cache of revoked tokens that sits in front
+of the `blocklist` collection.
+
+Every worker keeps its own copy of the blocklist. `blacklist_token` writes
+through the cache of the worker that revoked the token, and a background task
+periodically pulls the entries written by other workers, so a revocation is
+seen everywhere within `REVOCATION_SYNC_SECONDS`. Until the first sync, or
+after the cache had to drop entries to stay within `REVOCATION_CACHE_SIZE`
+and until the last of the dropped tokens has expired, a miss cannot be trusted
+and the caller falls back to the database.
+
+Tokens are identified by their SHA-256 digest rather than stored verbatim, and
+blocklist entries carry their expiry as a BSON date so that the TTL index on
+`expire` removes them once the token could no longer be used anyway.
+"""
+import asyncio
+import hashlib
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.db.engine import db
+
+logger = logging.getLogger(__name__)
+
+
+def token_digest(token: str) -> str:
+    """
+    Return the digest identifying `token` in the blocklist.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _timestamp(expire: Optional[datetime]) -> Optional[float]:
+    if expire is None:
+        return None
+    # PyMongo returns naive datetimes in UTC.
+    return expire.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RevocationCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._revoked: dict[str, float] = {}
+        # (expire, token_hash) of the entries, soonest expiry first. Entries
+        # removed from `_revoked` are left behind and skipped when popped.
+        self._expiries: list[tuple[float, str]] = []
+        # Misses cannot be trusted until the dropped entries have expired.
+        self._dropped_until = 0.0
+        self._synced_at: Optional[datetime] = None
+
+    def add(self, token_hash: str, expire: Optional[float]):
+        """
+        Record a revoked token until its own expiry time.
+
+        Parameters:
+        - token_hash (str): The digest of the revoked token.
+        - expire (float): The `exp` claim of the token, as a UNIX timestamp.
+        """
+        expire = expire if expire is not None else float("inf")
+        if self._revoked.get(token_hash) == expire:
+            # Already loaded by an overlapping sync.
+            return
+        self._revoked[token_hash] = expire
+        heapq.heappush(self._expiries, (expire, token_hash))
+        if len(self._revoked) > self.max_size:
+            self._purge_expired()
+        while len(self._revoked) > self.max_size:
+            # Drop the entry that expires first; until it expires, a miss may
+            # be that entry, so lookups must fall back to the database.
+            expire, token_hash = self._pop()
+            self._dropped_until = max(self._dropped_until, expire)
+
+    def is_revoked(self, token_hash: str) -> Optional[bool]:
+        """
+        Check whether the token with digest `token_hash` has been revoked.
+
+        Returns:
+        - bool: Whether the token is revoked, or None when the cache cannot
+          tell and the database must be checked.
+        """
+        expire = self._revoked.get(token_hash)
+        if expire is not None and expire > time.time():
+            return True
+        if self._synced_at is not None and self._dropped_until <= time.time():
+            return False
+        return None
+
+    def _pop(self) -> tuple[float, str]:
+        # Remove and return the live entry that expires first.
+        while True:
+            expire, token_hash = heapq.heappop(self._expiries)
+            if self._revoked.get(token_hash) == expire:
+                del self._revoked[token_hash]
+                return expire, token_hash
+
+    def _purge_expired(self):
+        now = time.time()
+        while self._expiries and self._expiries[0][0] <= now:
+            expire, token_hash = heapq.heappop(self._expiries)
+            if self._revoked.get(token_hash) == expire:
+                del self._revoked[token_hash]
+
+    async def sync(self):
+        """
+        Load the entries added to the blocklist since the previous sync.
+        """
+        started_at = datetime.utcnow()
+        query = {}
+        if self._synced_at is not None:
+            # Overlap with the previous sync to tolerate clock skew between
+            # the workers writing `created_at`.
+            margin = timedelta(seconds=settings.REVOCATION_SYNC_SECONDS)
+            query = {"created_at": {"$gte": self._synced_at - margin}}
+
+        projection = {"token_hash": 1, "expire": 1}
+        async for entry in db.blocklist.find(query, projection):
+            self.add(entry["token_hash"], _timestamp(entry.get("expire")))
+
+        self._purge_expired()
+        self._synced_at = started_at
+
+
+revocation_cache = RevocationCache(settings.REVOCATION_CACHE_SIZE)
+
+
+async def sync_revocations_periodically():
+    """
+    Keep `revocation_cache` in sync with the blocklist until cancelled.
+    """
+    while True:
+        try:
+            await revocation_cache.sync()
+        except PyMongoError as e:
+            logger.warning("Could not sync the revocation cache: %s", e)
+        await asyncio.sleep(settings.REVOCATION_SYNC_SECONDS)
@@ -1,14 +1,19 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional
 
 
 from jose import jwt, JWTError, ExpiredSignatureError
 from fastapi import HTTPException
 from passlib.context import CryptContext
 
-from fastapi import BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import settings
 from app.db.engine import db
+from app.core.revocation import revocation_cache, token_digest
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -18,6 +23,43 @@ ACESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 SECRET_KEY = settings.SECRET_KEY
 
 
+def _signing_key() -> tuple[str, Optional[dict]]:
+    key_id = settings.JWT_SIGNING_KEY_ID
+    if key_id is None:
+        return SECRET_KEY, None
+    if key_id not in settings.JWT_KEYS:
+        raise ValueError(f"JWT_SIGNING_KEY_ID {key_id!r} is not one of JWT_KEYS")
+    return settings.JWT_KEYS[key_id], {"kid": key_id}
+
+
+SIGNING_KEY, SIGNING_HEADERS = _signing_key()
+
+
+def encode_token(claims: dict) -> str:
+    """
+    Sign `claims` with the current signing key.
+    """
+    return jwt.encode(claims, SIGNING_KEY, algorithm=ALGORITHM, headers=SIGNING_HEADERS)
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verify a token with the key named by its `kid` header, or with
+    `SECRET_KEY` if it has none, and return its claims.
+
+    Raises:
+        JWTError: If the key is unknown, or the token is invalid or expired.
+    """
+    key_id = jwt.get_unverified_header(token).get("kid")
+    if key_id is None:
+        key = SECRET_KEY
+    elif isinstance(key_id, str) and key_id in settings.JWT_KEYS:
+        key = settings.JWT_KEYS[key_id]
+    else:
+        raise JWTError(f"Unknown signing key: {key_id}")
+    return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+
 def create_access_token(data: dict):
     """
     Create an access token using the provided data.
@@ -31,13 +73,13 @@ def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = encode_token(to_encode)
     return encoded_jwt
 
 
 def verify_refresh_token(refresh_token: str):
     try:
-        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(refresh_token)
         return payload.get("sub")
     except JWTError as e:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
@@ -66,31 +108,164 @@ def generate_refresh_token(data: dict):
     )
     to_encode = data.copy()
     # Generate the token using the secret key
-    refresh_token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    refresh_token = encode_token(to_encode)
 
     return refresh_token
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHashPool:
+    """
+    Runs bcrypt on a bounded pool of worker threads.
+
+    bcrypt releases the GIL while hashing, so threads are enough to keep the
+    event loop free. At most `workers` hashes run at once and up to
+    `queue_size` more wait for a worker; beyond that, requests are rejected
+    with a 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    async def run(self, func, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"},
+            )
+
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._pending -= 1
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    def stats(self) -> dict:
+        """
+        Return the queue depth and hash latency of the pool.
+        """
+        return {
+            "in_flight": min(self._pending, self.workers),
+            "queue_depth": max(self._pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "total_seconds": self.total_seconds,
+            "avg_seconds": self.total_seconds / self.completed if self.completed else 0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+password_hash_pool = PasswordHashPool(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE
+)
+
+
+class ClaimsCache:
+    """
+    LRU cache of the claims of verified tokens, keyed by token digest.
+
+    Verifying the signature of a token costs more than the rest of the
+    authentication, and a client sends the same token with every request
+    until it expires. An entry is kept until the `exp` claim of its token at
+    most, so an expired token is verified again, and rejected, instead of
+    being served from the cache. Tokens without `exp` are not cached.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token: str, token_hash: str) -> dict:
+        """
+        Return the claims of `token`, verifying it unless it is cached.
+
+        Args:
+            token (str): The token.
+            token_hash (str): Its digest, as computed by `token_digest`.
+
+        Raises:
+            JWTError: If the token is invalid or expired.
+        """
+        entry = self._entries.get(token_hash)
+        if entry is not None and entry[0] > time.time():
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return dict(entry[1])
+
+        self._entries.pop(token_hash, None)
+        self.misses += 1
+        claims = decode_token(token)
+        expire = claims.get("exp")
+        if isinstance(expire, (int, float)):
+            self._entries[token_hash] = (expire, claims)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        # Callers get their own copy, so that the cached claims cannot change.
+        return dict(claims)
 
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
 
+claims_cache = ClaimsCache(settings.TOKEN_CACHE_SIZE)
 
-def delete_blacklisted_tokens():
-    current_time = datetime.utcnow()
-    db.blocklist.delete_many({"expire": {"$lt": current_time}})
 
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(
+        pwd_context.verify, plain_password, hashed_password
+    )
+
+
+async def get_password_hash(password: str) -> str:
+    return await password_hash_pool.run(pwd_context.hash, password)
+
+
+async def blacklist_token(token: str):
+    """
+    Revoke a token until it expires.
 
-def blacklist_token(token: str, background_tasks: BackgroundTasks = None):
+    The blocklist stores the digest of the token and its expiry as a BSON date;
+    the TTL index on `expire` removes the entry once the token has expired.
+
+    Args:
+        token (str): The token to revoke.
+
+    Raises:
+        HTTPException: If the token is invalid or has already expired.
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         expire = payload.get("exp")
-        db.blocklist.insert_one({"token": token, "expire": expire})
-
-        if background_tasks is not None:
-            background_tasks.add_task(delete_blacklisted_tokens)
+        token_hash = token_digest(token)
+        await db.blocklist.update_one(
+            {"token_hash": token_hash},
+            {
+                "$setOnInsert": {
+                    "token_hash": token_hash,
+                    "expire": datetime.utcfromtimestamp(expire),
+                    "created_at": datetime.utcnow(),
+                }
+            },
+            upsert=True,
+        )
+        revocation_cache.add(token_hash, expire)
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"{e}")
@@ -0,0 +1,394 @@
+"""
+job.py
+
+This module contains the data access helpers for job openings: the bulk
+writes, and the job board query.
+
+The bulk helpers send a single unordered batch to the database, so a failing
+opening does not stop the others, and report the outcome of every opening in
+the order it was given. Updates made at a given version are the exception:
+each is sent on its own, so that a stale one is reported as a conflict.
+
+The job board query filters openings on the fields listed in `board_filter`
+and returns a page of them, optionally with facet counts. The page is read by
+a pipeline of its own, as stages inside `$facet` cannot use indexes. The
+counts need every matching opening rather than a page, so they are only
+computed when asked for, by a `$facet` over the matches run alongside the
+page. Every board query filters on `status`, so the board indexes lead with
+it, followed by the other equality filters and the sort key.
+"""
+import asyncio
+from enum import Enum
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.crud.pagination import (
+    decode_cursor,
+    decode_sort_cursor,
+    encode_cursor,
+    encode_sort_cursor,
+)
+from app.crud.search import SEARCH_COLLATION
+from app.crud.update import apply_update, build_update, version_query
+from app.db.engine import db
+from app.schemas.company import OpeningPatch, OpeningStatus
+
+# Number of values returned per facet.
+FACET_SIZE = 20
+
+
+class JobSort(str, Enum):
+    newest = "newest"
+    oldest = "oldest"
+    openings = "openings"
+
+
+class SkillMatch(str, Enum):
+    all = "all"
+    any = "any"
+
+
+def board_indexes() -> list[IndexModel]:
+    """
+    Build the indexes serving the job board query.
+    """
+    # The board compares strings case-insensitively, and an index is only
+    # used for string comparisons made with its own collation.
+    return [
+        IndexModel(
+            [("status", ASCENDING), ("_id", ASCENDING)],
+            name="board_status",
+            collation=SEARCH_COLLATION,
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("skills_needed", ASCENDING), ("_id", ASCENDING)],
+            name="board_skills",
+            collation=SEARCH_COLLATION,
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("job_role", ASCENDING), ("_id", ASCENDING)],
+            name="board_role",
+            collation=SEARCH_COLLATION,
+        ),
+        IndexModel(
+            [
+                ("status", ASCENDING),
+                ("no_of_openings", ASCENDING),
+                ("_id", ASCENDING),
+            ],
+            name="board_openings",
+            collation=SEARCH_COLLATION,
+        ),
+    ]
+
+
+def _write_errors(error: BulkWriteError) -> dict[int, str]:
+    return {e["index"]: e["errmsg"] for e in error.details.get("writeErrors", [])}
+
+
+async def insert_openings(openings: list[dict]) -> list[dict]:
+    """
+    Insert job openings in one round-trip.
+
+    Parameters:
+    - openings (list): The documents of the openings to insert.
+
+    Returns:
+    - list: One result per opening, in order, with its `index` and either the
+      `id` it was created with or the `error` that prevented it.
+    """
+    errors = {}
+    try:
+        # insert_many sets the `_id` of every document before sending them.
+        await db.Opening.insert_many(openings, ordered=False)
+    except BulkWriteError as e:
+        errors = _write_errors(e)
+
+    return [
+        {"index": index, "status": "error", "error": errors[index]}
+        if index in errors
+        else {"index": index, "status": "created", "id": str(opening["_id"])}
+        for index, opening in enumerate(openings)
+    ]
+
+
+async def _update_batch(
+    operations: list[UpdateOne], positions: list[tuple[dict, ObjectId]], owned: dict
+):
+    errors = {}
+    try:
+        matched = (await db.Opening.bulk_write(operations, ordered=False)).matched_count
+    except BulkWriteError as e:
+        errors = _write_errors(e)
+        matched = e.details.get("nMatched", 0)
+
+    found = None
+    if matched + len(errors) < len(operations):
+        # The result only counts the matches, so look up which openings are
+        # gone.
+        ids = [job_object_id for _, job_object_id in positions]
+        cursor = db.Opening.find({**owned, "_id": {"$in": ids}}, {"_id": 1})
+        found = {doc["_id"] async for doc in cursor}
+
+    for index, (result, job_object_id) in enumerate(positions):
+        if index in errors:
+            result.update(status="error", error=errors[index])
+        elif found is not None and job_object_id not in found:
+            result.update(status="not_found", error="Job not found")
+        else:
+            result["status"] = "updated"
+
+
+async def _update_versioned(
+    result: dict, job_object_id: ObjectId, version: int, update: dict, owned: dict
+):
+    try:
+        document = await apply_update(
+            db.Opening, job_object_id, update, version, {"_id": 1}, owned
+        )
+    except HTTPException:
+        result.update(status="conflict", error="Job changed since the given version")
+        return
+    except PyMongoError as e:
+        result.update(status="error", error=str(e))
+        return
+    if document is None:
+        result.update(status="not_found", error="Job not found")
+    else:
+        result["status"] = "updated"
+
+
+async def update_openings(
+    patches: list[OpeningPatch], company_id: ObjectId
+) -> list[dict]:
+    """
+    Apply partial updates to job openings.
+
+    Updates without a `version` are sent as one batch. An update with a
+    `version` is sent on its own, alongside the batch, since the result of a
+    batch only counts the matches and cannot tell which update was stale.
+
+    Parameters:
+    - patches (list): The updates, each with the `id` of its opening.
+    - company_id (ObjectId): The company making the updates. Openings of
+      other companies are reported as not found.
+
+    Returns:
+    - list: One result per update, in order, with its `index`, the `id` of
+      the opening and its `status`: "updated", or "not_found", "conflict" or
+      "error" along with the `error` that prevented it.
+    """
+    results = [{"index": index, "id": patch.id} for index, patch in enumerate(patches)]
+    owned = {"company_id": company_id}
+    operations, positions, writes = [], [], []
+    for result, patch in zip(results, patches):
+        # ObjectId(None) would generate a new id rather than fail.
+        if patch.id is None:
+            result.update(status="error", error="Missing job id")
+            continue
+        try:
+            job_object_id = ObjectId(patch.id)
+            update = build_update(patch)
+        except (InvalidId, TypeError):
+            result.update(status="error", error="Invalid job id")
+            continue
+        except HTTPException as e:
+            result.update(status="error", error=e.detail)
+            continue
+        if not update:
+            result.update(status="error", error="Nothing to update")
+            continue
+        if patch.version is None:
+            operations.append(
+                UpdateOne(version_query(job_object_id, None, owned), update)
+            )
+            positions.append((result, job_object_id))
+        else:
+            writes.append(
+                _update_versioned(result, job_object_id, patch.version, update, owned)
+            )
+
+    if operations:
+        writes.append(_update_batch(operations, positions, owned))
+    await asyncio.gather(*writes)
+    return results
+
+
+def board_filter(
+    status: list[OpeningStatus],
+    skills: Optional[list[str]] = None,
+    skill_match: SkillMatch = SkillMatch.all,
+    job_role: Optional[str] = None,
+    qualification: Optional[str] = None,
+    min_openings: Optional[int] = None,
+    max_openings: Optional[int] = None,
+) -> dict:
+    """
+    Build the query selecting the openings shown on the job board.
+
+    Parameters:
+    - status (list): The statuses to include.
+    - skills (list): Skills the openings need; all of them or any of them,
+      depending on `skill_match`.
+    - job_role (str): The exact job role, ignoring case.
+    - qualification (str): The exact qualification required, ignoring case.
+    - min_openings (int), max_openings (int): Bounds on the number of openings.
+
+    Returns:
+    - dict: The MongoDB query.
+    """
+    query = {"status": {"$in": [s.value for s in status]}}
+    if skills:
+        operator = "$all" if skill_match == SkillMatch.all else "$in"
+        query["skills_needed"] = {operator: skills}
+    if job_role is not None:
+        query["job_role"] = job_role
+    if qualification is not None:
+        query["qualification_required"] = qualification
+    openings = {}
+    if min_openings is not None:
+        openings["$gte"] = min_openings
+    if max_openings is not None:
+        openings["$lte"] = max_openings
+    if openings:
+        query["no_of_openings"] = openings
+    return query
+
+
+def _keyset(sort: JobSort, after: Optional[str]) -> tuple[Optional[dict], dict]:
+    if sort == JobSort.openings:
+        order = {"no_of_openings": DESCENDING, "_id": DESCENDING}
+        if after is None:
+            # Openings without a count cannot be placed by the cursor.
+            return {"no_of_openings": {"$type": "number"}}, order
+        value, last_id = decode_sort_cursor(after)
+        keyset = {
+            "$or": [
+                {"no_of_openings": {"$lt": value}},
+                {"no_of_openings": value, "_id": {"$lt": last_id}},
+            ]
+        }
+        return keyset, order
+
+    direction = DESCENDING if sort == JobSort.newest else ASCENDING
+    if after is None:
+        return None, {"_id": direction}
+    operator = "$lt" if direction == DESCENDING else "$gt"
+    return {"_id": {operator: decode_cursor(after)}}, {"_id": direction}
+
+
+def _next_cursor(sort: JobSort, document: dict) -> str:
+    if sort == JobSort.openings:
+        return encode_sort_cursor(document["no_of_openings"], document["_id"])
+    return encode_cursor(document["_id"])
+
+
+def _count_by(field: str) -> list[dict]:
+    return [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+        {"$limit": FACET_SIZE},
+    ]
+
+
+def _buckets(facet: list) -> list[dict]:
+    return [{"value": bucket["_id"], "count": bucket["count"]} for bucket in facet]
+
+
+def page_pipeline(
+    query: dict,
+    sort: JobSort = JobSort.newest,
+    after: Optional[str] = None,
+    limit: int = 50,
+    projection: Optional[dict] = None,
+) -> list[dict]:
+    """
+    Build the pipeline reading a page of the openings matching `query`, one
+    more than `limit` to tell whether there is a next page. It must run with
+    `SEARCH_COLLATION` to use the board indexes.
+    """
+    keyset, order = _keyset(sort, after)
+    pipeline = [
+        {"$match": {"$and": [query, keyset]} if keyset else query},
+        {"$sort": order},
+        {"$limit": limit + 1},
+    ]
+    if projection:
+        # `no_of_openings` is needed to build the cursor when sorting by it.
+        pipeline.append({"$project": {**projection, "no_of_openings": 1}})
+    return pipeline
+
+
+async def query_openings(
+    query: dict,
+    sort: JobSort = JobSort.newest,
+    after: Optional[str] = None,
+    limit: int = 50,
+    projection: Optional[dict] = None,
+    facets: bool = False,
+) -> dict:
+    """
+    Fetch a page of the openings matching `query`, and optionally the facet
+    counts of every matching opening.
+
+    Parameters:
+    - query (dict): The filter built by `board_filter`.
+    - sort (JobSort): The order of the results.
+    - after (str): The cursor returned with the previous page, if any.
+    - limit (int): The page size.
+    - projection (dict): The fields to return. `_id` must not be excluded.
+    - facets (bool): Also count the matching openings per skill, role and
+      status.
+
+    Returns:
+    - dict: The page as `data`, the cursor of the next page as `next_cursor`,
+      and, with `facets`, the number of matching openings as `total` and the
+      counts as `facets`.
+    """
+    pipeline = page_pipeline(query, sort, after, limit, projection)
+    page_cursor = db.Opening.aggregate(pipeline, collation=SEARCH_COLLATION)
+
+    if facets:
+        facet_pipeline = [
+            {"$match": query},
+            {
+                "$facet": {
+                    "total": [{"$count": "count"}],
+                    "skills_needed": [
+                        {"$unwind": "$skills_needed"},
+                        *_count_by("skills_needed"),
+                    ],
+                    "job_role": _count_by("job_role"),
+                    "status": _count_by("status"),
+                }
+            },
+        ]
+        facet_cursor = db.Opening.aggregate(facet_pipeline, collation=SEARCH_COLLATION)
+        documents, (result,) = await asyncio.gather(
+            page_cursor.to_list(length=None), facet_cursor.to_list(length=1)
+        )
+    else:
+        documents = await page_cursor.to_list(length=None)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = _next_cursor(sort, documents[-1])
+    if projection and "no_of_openings" not in projection:
+        for document in documents:
+            document.pop("no_of_openings", None)
+
+    page = {"data": documents, "next_cursor": next_cursor}
+    if facets:
+        page["total"] = result["total"][0]["count"] if result["total"] else 0
+        page["facets"] = {
+            "skills_needed": _buckets(result["skills_needed"]),
+            "job_role": _buckets(result["job_role"]),
+            "status": _buckets(result["status"]),
+        }
+    return page
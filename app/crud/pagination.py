@@ -0,0 +1,142 @@
+"""
+pagination.py
+
+This module contains helpers for keyset (cursor based) pagination and NDJSON
+streaming over MongoDB collections.
+
+Pages are ordered by `_id` and the opaque `after` cursor encodes the `_id` of
+the last document of the previous page, so every page is a single range scan
+on the `_id` index no matter how deep the client pages.
+"""
+import base64
+from typing import Callable, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.core.config import settings
+from app.core.responses import dumps
+
+
+def encode_cursor(object_id: ObjectId) -> str:
+    """
+    Encode an ObjectId as an opaque, URL-safe pagination cursor.
+    """
+    return base64.urlsafe_b64encode(object_id.binary).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Raises:
+    - HTTPException: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return ObjectId(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def encode_sort_cursor(value: int, object_id: ObjectId) -> str:
+    """
+    Encode the sort key of a document ordered by an integer field, then by
+    `_id`, as an opaque, URL-safe pagination cursor.
+    """
+    raw = f"{value}.{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sort_cursor(cursor: str) -> Tuple[int, ObjectId]:
+    """
+    Decode a cursor produced by `encode_sort_cursor`.
+
+    Raises:
+    - HTTPException: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, object_id = base64.urlsafe_b64decode(padded).decode().split(".")
+        return int(value), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _keyset_query(query: dict, after: Optional[str]) -> dict:
+    if after is None:
+        return query
+    return {**query, "_id": {"$gt": decode_cursor(after)}}
+
+
+async def fetch_page(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    projection: Optional[dict] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    transform: Optional[Callable[[dict], dict]] = None,
+) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page of documents matching `query`.
+
+    Parameters:
+    - collection: The collection to read from.
+    - query (dict): The filter to apply.
+    - projection (dict): The projection to apply. `_id` must not be excluded.
+    - after (str): The cursor returned with the previous page, if any.
+    - limit (int): The page size, defaults to `settings.PAGE_SIZE_DEFAULT`.
+    - transform: Applied to each document before it is returned, if given.
+
+    Returns:
+    - tuple: The page of documents and the cursor of the next page, or None
+      when this is the last page.
+    """
+    limit = limit or settings.PAGE_SIZE_DEFAULT
+    # Fetch one extra document to find out whether there is a next page.
+    cursor = (
+        collection.find(_keyset_query(query, after), projection)
+        .sort("_id", 1)
+        .limit(limit + 1)
+    )
+    documents = await cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1]["_id"])
+
+    if transform is not None:
+        documents = [transform(document) for document in documents]
+    return documents, next_cursor
+
+
+def stream_ndjson(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    projection: Optional[dict] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    transform: Optional[Callable[[dict], dict]] = None,
+) -> StreamingResponse:
+    """
+    Stream the documents matching `query` as newline-delimited JSON.
+
+    Documents are written as the cursor yields them, so memory use stays flat
+    regardless of the size of the result. Unlike `fetch_page`, no limit is
+    applied unless one is given explicitly.
+    """
+    cursor = collection.find(_keyset_query(query, after), projection).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    async def lines():
+        async for document in cursor:
+            if transform is not None:
+                document = transform(document)
+            yield dumps(document) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
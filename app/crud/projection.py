@@ -0,0 +1,94 @@
+"""
+projection.py
+
+This module contains helpers deriving MongoDB projections from the response
+models, so that documents read with them already have the shape of the model
+and can be returned without being validated again, and the sparse fieldsets
+selected by clients with the `fields` query parameter.
+"""
+from typing import Optional, Type
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+
+from app.schemas.company import CompanyProfile, OpeningOut
+from app.schemas.developer import DeveloperProfile
+
+# Named fieldsets accepted by `fields`, besides "full" which selects every
+# field of the model.
+FIELD_PRESETS = {
+    DeveloperProfile: {
+        "summary": ["name", "profile_pic", "developer_role", "skills", "location"],
+    },
+    CompanyProfile: {
+        "summary": ["name", "profile_pic", "industry", "location"],
+    },
+    OpeningOut: {
+        "summary": ["job_role", "skills_needed", "no_of_openings", "status"],
+    },
+}
+
+
+def model_projection(model: Type[BaseModel]) -> dict:
+    """
+    Build a projection returning `_id` and the fields of `model`.
+    """
+    return {name: 1 for name in model.model_fields if name != "id"}
+
+
+def expose_id(document: dict) -> dict:
+    """
+    Rename `_id` to `id` in place, as the response models do when serialized
+    with `response_model_by_alias=False`.
+    """
+    document["id"] = document.pop("_id")
+    return document
+
+
+def select_fields(model: Type[BaseModel], fields: str) -> dict:
+    """
+    Build the projection for the fields selected by a client.
+
+    Parameters:
+    - model: The response model the fields are validated against.
+    - fields (str): A preset name ("summary" or "full"), or a comma-separated
+      list of fields of `model`.
+
+    Returns:
+    - dict: A projection returning `_id` and the selected fields.
+
+    Raises:
+    - HTTPException: If a field is not part of `model`.
+    """
+    if fields == "full":
+        return model_projection(model)
+    if fields in FIELD_PRESETS.get(model, {}):
+        return {name: 1 for name in FIELD_PRESETS[model][fields]}
+
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown fields {unknown}, allowed: {list(model.model_fields)}",
+        )
+    return {name: 1 for name in names if name != "id"} or {"_id": 1}
+
+
+def field_projection(model: Type[BaseModel]):
+    """
+    Build a dependency reading the `fields` query parameter for `model`.
+
+    The dependency returns the projection of the selected fields, or None when
+    the client did not select any.
+    """
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description='Comma-separated fields to return, or "summary" / "full"',
+        )
+    ) -> Optional[dict]:
+        return select_fields(model, fields) if fields else None
+
+    return dependency
@@ -0,0 +1,163 @@
+"""
+search.py
+
+This module contains the search subsystem for developers, companies and job
+openings.
+
+Only whitelisted fields can be searched. Prefix and exact matches are
+case-insensitive range/equality queries served by indexes built with the same
+case-insensitive collation, and full-text matches use a weighted text index
+and are ordered by relevance.
+"""
+from enum import Enum
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.collation import Collation, CollationStrength
+
+
+class SearchMode(str, Enum):
+    prefix = "prefix"
+    exact = "exact"
+    text = "text"
+
+
+# Case-insensitive comparison, shared by the search queries and their indexes.
+SEARCH_COLLATION = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+# Fields that can be used with the prefix and exact modes, per collection.
+SEARCHABLE_FIELDS = {
+    "Developers": [
+        "name",
+        "skills",
+        "developer_role",
+        "location",
+        "education",
+        "experience",
+    ],
+    "Company": ["name", "full_name", "industry", "location"],
+    "Opening": ["job_role", "skills_needed", "qualification_required", "status"],
+}
+
+# Fields holding lists of strings, matched element-wise.
+ARRAY_FIELDS = {"skills", "skills_needed"}
+
+# Fields covered by the full-text index of each collection, with their weights.
+TEXT_FIELDS = {
+    "Developers": {"name": 5, "skills": 5, "education": 1, "experience": 1},
+    "Company": {"name": 5, "full_name": 3, "industry": 2, "detail_intro": 1},
+    "Opening": {"job_role": 5, "skills_needed": 3, "job_description": 1},
+}
+
+
+def search_indexes(collection_name: str) -> list[IndexModel]:
+    """
+    Build the indexes needed to search `collection_name`.
+    """
+    indexes = [
+        IndexModel(
+            [(field, ASCENDING)],
+            name=f"search_{field}",
+            collation=SEARCH_COLLATION,
+        )
+        for field in SEARCHABLE_FIELDS[collection_name]
+    ]
+    weights = TEXT_FIELDS[collection_name]
+    indexes.append(
+        IndexModel(
+            [(field, TEXT) for field in weights],
+            name="search_text",
+            weights=weights,
+        )
+    )
+    return indexes
+
+
+def _field_query(field: str, value: str, mode: SearchMode) -> dict:
+    if mode == SearchMode.exact:
+        condition = {"$eq": value}
+    else:
+        # Every string starting with `value` sorts between `value` and
+        # `value + "\uffff"`, so a prefix match is a bounded index range scan.
+        condition = {"$gte": value, "$lt": value + "\uffff"}
+
+    if field in ARRAY_FIELDS:
+        return {field: {"$elemMatch": condition}}
+    return {field: condition}
+
+
+def search_query(
+    collection_name: str,
+    base_query: dict,
+    field: Optional[str],
+    value: str,
+    mode: SearchMode,
+) -> dict:
+    """
+    Build the query of a search, see `search_collection`. Prefix and exact
+    queries must run with `SEARCH_COLLATION`.
+
+    Raises:
+    - HTTPException: If the field cannot be searched.
+    """
+    if mode == SearchMode.text:
+        return {**base_query, "$text": {"$search": value}}
+
+    allowed = SEARCHABLE_FIELDS[collection_name]
+    if field not in allowed:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Cannot search by {field!r}, allowed fields: {allowed}",
+        )
+    return {**base_query, **_field_query(field, value, mode)}
+
+
+async def search_collection(
+    collection: AsyncIOMotorCollection,
+    base_query: dict,
+    field: Optional[str],
+    value: str,
+    mode: SearchMode,
+    projection: Optional[dict] = None,
+    limit: int = 50,
+    transform: Optional[Callable[[dict], dict]] = None,
+) -> list[dict]:
+    """
+    Search a collection for documents matching `value`.
+
+    Parameters:
+    - collection: The collection to search.
+    - base_query (dict): Filter that every result must also match.
+    - field (str): The whitelisted field to search, ignored in text mode.
+    - value (str): The value to search for.
+    - mode (SearchMode): Prefix, exact or full-text match.
+    - projection (dict): The projection to apply to the results.
+    - limit (int): The maximum number of results.
+    - transform: Applied to each document before it is returned, if given.
+
+    Returns:
+    - list: The matching documents, most relevant first.
+
+    Raises:
+    - HTTPException: If the field cannot be searched.
+    """
+    projection = dict(projection or {})
+    query = search_query(collection.name, base_query, field, value, mode)
+
+    if mode == SearchMode.text:
+        projection["score"] = {"$meta": "textScore"}
+        cursor = collection.find(query, projection).sort(
+            [("score", {"$meta": "textScore"})]
+        )
+    else:
+        cursor = collection.find(
+            query, projection or None, collation=SEARCH_COLLATION
+        ).sort(field, ASCENDING)
+
+    results = []
+    async for document in cursor.limit(limit):
+        document.pop("score", None)
+        results.append(transform(document) if transform else document)
+    return results
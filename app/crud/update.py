@@ -0,0 +1,129 @@
+"""
+update.py
+
+This module contains the helpers turning partial updates into minimal MongoDB
+update documents and applying them with optimistic concurrency.
+
+Only the fields a client sent are written: a value is `$set`, an explicit
+`null` is `$unset`, and an `ArrayPatch` becomes `$addToSet` or `$pull`, so the
+update document, and the oplog entry it produces, stays proportional to the
+change. Every update increments the `version` field of the document. A client
+that sends the `version` it last read only updates the document if nobody
+else has changed it since, and gets a 409 otherwise. Documents written before
+versioning count as version 0.
+"""
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+
+from app.schemas.common import ArrayPatch
+
+UNSET_FIELDS = {"id", "version"}
+
+
+def build_update(patch: BaseModel, ignore_none: bool = False) -> dict:
+    """
+    Build the update document for the fields set on `patch`.
+
+    Parameters:
+    - patch (BaseModel): The update, as validated from the request body.
+    - ignore_none (bool): Skip `null` fields instead of unsetting them.
+
+    Returns:
+    - dict: The update operators, or an empty dict if there is nothing to
+      update.
+
+    Raises:
+    - HTTPException: If an array field is both added to and removed from.
+    """
+    update = {}
+    values = patch.model_dump(exclude_unset=True)
+    for field in patch.model_fields_set - UNSET_FIELDS:
+        value = getattr(patch, field)
+        if value is None:
+            if not ignore_none:
+                update.setdefault("$unset", {})[field] = ""
+        elif isinstance(value, ArrayPatch):
+            if value.add and value.remove:
+                # MongoDB rejects two operators on the same field.
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Cannot add to and remove from {field} in one update",
+                )
+            if value.add:
+                update.setdefault("$addToSet", {})[field] = {"$each": value.add}
+            elif value.remove:
+                update.setdefault("$pull", {})[field] = {"$in": value.remove}
+        else:
+            update.setdefault("$set", {})[field] = values[field]
+
+    if update:
+        update["$inc"] = {"version": 1}
+    return update
+
+
+def version_query(
+    object_id: ObjectId, version: Optional[int], conditions: Optional[dict] = None
+) -> dict:
+    """
+    Return the query matching the document `object_id` at `version`, or at
+    any version if `version` is None, and meeting `conditions` if given.
+    """
+    query = {**(conditions or {}), "_id": object_id}
+    if version is not None:
+        # A missing field matches null, which covers unversioned documents.
+        query["version"] = version if version else {"$in": [0, None]}
+    return query
+
+
+async def apply_update(
+    collection,
+    object_id: ObjectId,
+    update: dict,
+    version: Optional[int] = None,
+    projection: Optional[dict] = None,
+    conditions: Optional[dict] = None,
+) -> Optional[dict]:
+    """
+    Apply `update` to a document and return the updated document.
+
+    Parameters:
+    - collection: The collection holding the document.
+    - object_id (ObjectId): The id of the document.
+    - update (dict): The update built by `build_update`. An empty update
+      returns the document unchanged.
+    - version (int): The version the client last read, if any.
+    - projection (dict): The fields to return.
+    - conditions (dict): Further conditions the document must meet, such as
+      its owner; a document not meeting them is treated as missing.
+
+    Returns:
+    - dict: The updated document, or None if it does not exist.
+
+    Raises:
+    - HTTPException: If the document has changed since `version`.
+    """
+    if not update:
+        document = await collection.find_one(
+            version_query(object_id, None, conditions), projection
+        )
+    else:
+        document = await collection.find_one_and_update(
+            version_query(object_id, version, conditions),
+            update,
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    if document is None and version is not None:
+        # Only a failed conditional update pays for telling the cases apart.
+        query = version_query(object_id, None, conditions)
+        if await collection.count_documents(query, limit=1):
+            raise HTTPException(
+                status_code=409,
+                detail="The document was changed by another request",
+            )
+    return document
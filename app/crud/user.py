@@ -0,0 +1,85 @@
+"""
+user.py
+
+This module contains the data access helpers for user identities.
+
+Credentials live in the `users` collection, keyed by the `_id` of the user's
+profile document, with unique indexes on `username` and `email`. Every auth
+operation is therefore a single indexed lookup, and the unique indexes make
+registration atomic. The profile itself lives in `Company` or `Developers`,
+depending on the role.
+"""
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.db.engine import db
+
+PROFILE_COLLECTIONS = {"company": "Company", "developer": "Developers"}
+
+
+def profile_collection(role: str):
+    """
+    Return the collection holding the profiles of users with `role`.
+    """
+    return db[PROFILE_COLLECTIONS[role]]
+
+
+async def get_user_by_login(username_or_email: str) -> Optional[dict]:
+    """
+    Find a user by username or email.
+    """
+    return await db.users.find_one(
+        {"$or": [{"username": username_or_email}, {"email": username_or_email}]}
+    )
+
+
+async def get_user_by_id(user_id: str) -> Optional[dict]:
+    """
+    Find a user by the id of their profile.
+    """
+    return await db.users.find_one({"_id": ObjectId(user_id)})
+
+
+async def create_user(
+    username: str, email: str, hashed_password: str, role: str
+) -> Optional[ObjectId]:
+    """
+    Create a user and their empty profile.
+
+    Returns:
+    - ObjectId: The id of the new user, or None if the username or email is
+      already taken.
+    """
+    user_id = ObjectId()
+    try:
+        await db.users.insert_one(
+            {
+                "_id": user_id,
+                "username": username,
+                "email": email,
+                "password": hashed_password,
+                "role": role,
+            }
+        )
+    except DuplicateKeyError:
+        return None
+
+    try:
+        await profile_collection(role).insert_one(
+            {"_id": user_id, "username": username, "email": email, "role": role}
+        )
+    except Exception:
+        await db.users.delete_one({"_id": user_id})
+        raise
+    return user_id
+
+
+async def update_password(user_id: str, hashed_password: str):
+    """
+    Replace the password of a user.
+    """
+    await db.users.update_one(
+        {"_id": ObjectId(user_id)}, {"$set": {"password": hashed_password}}
+    )
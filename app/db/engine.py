@@ -1,21 +1,69 @@
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
+import asyncio
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
 from app.core.config import settings
+from app.db.monitoring import command_metrics, pool_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _write_concern(w: str):
+    # PyMongo expects a number of nodes as an int and a tag set as a str.
+    return int(w) if w.isdigit() else w
 
 
 class Database:
     def __init__(self, uri: str, db_name: str):
-        self.client = MongoClient(uri)
+        # Motor wraps PyMongo's pool and runs every operation off the event
+        # loop, so awaiting a query never blocks other in-flight requests.
+        self.client = AsyncIOMotorClient(
+            uri,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            readPreference=settings.MONGODB_READ_PREFERENCE,
+            w=_write_concern(settings.MONGODB_WRITE_CONCERN),
+            event_listeners=[command_metrics, pool_metrics],
+        )
         self.db = self.client[db_name]
 
 
 db = Database(settings.MONGODB_URI, settings.MONGODB_NAME).db
 
+_health = None
+
 
-def check_db_connection():
+async def probe_db_connection():
+    """
+    Ping the database and cache the result for `check_db_connection`.
+    """
+    global _health
     try:
-        # The ismaster command is cheap and does not require auth.
-        db.command("ismaster")
-        return {"status": "Database is connected"}
-    except ServerSelectionTimeoutError as e:
-        return {"status": "Database connection failed", "exception": str(e)}
+        # The ping command is cheap and does not require auth.
+        await db.command("ping")
+        _health = {"status": "Database is connected"}
+    except PyMongoError as e:
+        _health = {"status": "Database connection failed", "exception": str(e)}
+    return _health
+
+
+async def probe_db_connection_periodically():
+    """
+    Refresh the cached database health until cancelled.
+    """
+    while True:
+        await probe_db_connection()
+        await asyncio.sleep(settings.MONGODB_HEALTH_CHECK_SECONDS)
+
+
+async def check_db_connection():
+    """
+    Return the database health from the last probe, probing only if the
+    database has never been probed.
+    """
+    if _health is None:
+        return await probe_db_connection()
+    return _health
@@ -0,0 +1,231 @@
+"""
+indexes.py
+
+This module contains the declarative registry of the MongoDB indexes used by
+the application, and the helpers that compare it with the indexes that exist
+in the database and bring the database in sync.
+
+The missing indexes are created at startup from the lifespan hook in
+`app/main.py`. Indexes that differ from the registry are only rebuilt by hand,
+since every worker runs the startup and a rebuild leaves the collection
+without the index, unique constraint included, until it is created again:
+
+    python -m app.db.indexes diff
+    python -m app.db.indexes sync [--drop-extra]
+"""
+import argparse
+import asyncio
+import logging
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.crud.job import board_indexes
+from app.crud.search import search_indexes
+from app.db.engine import db
+
+logger = logging.getLogger(__name__)
+
+
+def _unique_if_set(field: str) -> IndexModel:
+    # Profiles are created without a username and often without an email,
+    # and are stored with `null` for them. A sparse index would still index
+    # the nulls and let only one such profile exist, so only the strings are
+    # indexed.
+    return IndexModel(
+        [(field, ASCENDING)],
+        name=f"{field}_unique",
+        unique=True,
+        partialFilterExpression={field: {"$type": "string"}},
+    )
+
+
+def _user_indexes(collection_name: str) -> list[IndexModel]:
+    return [
+        _unique_if_set("username"),
+        _unique_if_set("email"),
+        IndexModel([("role", ASCENDING)], name="role"),
+        *search_indexes(collection_name),
+    ]
+
+
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "Developers": _user_indexes("Developers"),
+    "Company": _user_indexes("Company"),
+    "Opening": [
+        # Pages of a company's openings are cut by `_id`.
+        IndexModel([("company_id", ASCENDING), ("_id", ASCENDING)], name="company_id"),
+        *search_indexes("Opening"),
+        *board_indexes(),
+    ],
+    "blocklist": [
+        IndexModel([("token_hash", ASCENDING)], name="token_hash_unique", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        # Entries are removed by MongoDB once the revoked token has expired.
+        IndexModel([("expire", ASCENDING)], name="expire_ttl", expireAfterSeconds=0),
+    ],
+    "waitlist": [
+        # Emails are stored lowercased, so this also rejects case variants.
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+}
+
+# Error code of dropping an index that does not exist.
+_INDEX_NOT_FOUND = 27
+
+# Index options that make two indexes with the same name different.
+_COMPARED_OPTIONS = (
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+    "weights",
+)
+
+
+def _matches(declared: dict, existing: dict) -> bool:
+    if "weights" not in declared:
+        declared_key = [(field, int(order)) for field, order in declared["key"].items()]
+        existing_key = [(field, int(order)) for field, order in existing["key"]]
+        if declared_key != existing_key:
+            return False
+
+    for option in _COMPARED_OPTIONS:
+        if declared.get(option) != existing.get(option):
+            return False
+
+    existing_collation = existing.get("collation", {})
+    for option, value in declared.get("collation", {}).items():
+        if existing_collation.get(option) != value:
+            return False
+
+    return True
+
+
+def plan_stages(plan) -> set[str]:
+    """
+    Return the stages of the winning plan of an `explain` output, e.g. to check
+    that a query runs an IXSCAN rather than a COLLSCAN.
+    """
+    # The plan is nested differently depending on the server version and on
+    # whether the query was pushed down from an aggregation.
+    if isinstance(plan, list):
+        return set().union(*map(plan_stages, plan)) if plan else set()
+    if not isinstance(plan, dict):
+        return set()
+    stages = {plan["stage"]} if isinstance(plan.get("stage"), str) else set()
+    for key, value in plan.items():
+        if key != "rejectedPlans":
+            stages |= plan_stages(value)
+    return stages
+
+
+async def diff_indexes() -> dict:
+    """
+    Compare the registry with the indexes that exist in the database.
+
+    Returns:
+    - dict: Per collection, the names of the declared indexes that are
+      `missing` or `changed`, and of the `extra` indexes not in the registry.
+    """
+    diff = {}
+    for collection_name, indexes in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        existing.pop("_id_", None)
+
+        declared = {index.document["name"]: index.document for index in indexes}
+        diff[collection_name] = {
+            "missing": [name for name in declared if name not in existing],
+            "changed": [
+                name
+                for name, document in declared.items()
+                if name in existing and not _matches(document, existing[name])
+            ],
+            "extra": [name for name in existing if name not in declared],
+        }
+    return diff
+
+
+async def _drop_index(collection, name: str):
+    try:
+        await collection.drop_index(name)
+    except OperationFailure as e:
+        # Already dropped by someone else.
+        if e.code != _INDEX_NOT_FOUND:
+            raise
+
+
+async def sync_indexes(rebuild: bool = False, drop_extra: bool = False) -> dict:
+    """
+    Create the missing indexes, and optionally rebuild the changed ones.
+
+    An index that cannot be built, e.g. a unique index over duplicated data, is
+    logged and skipped so that one bad index does not prevent startup.
+
+    Parameters:
+    - rebuild (bool): Drop and recreate the indexes that differ from the
+      registry. Otherwise they are only logged.
+    - drop_extra (bool): Also drop the indexes that are not in the registry.
+
+    Returns:
+    - dict: The diff that was found, as returned by `diff_indexes`.
+    """
+    diff = await diff_indexes()
+    for collection_name, changes in diff.items():
+        collection = db[collection_name]
+        declared = {index.document["name"]: index for index in INDEXES[collection_name]}
+
+        to_create = changes["missing"]
+        if rebuild:
+            to_create = to_create + changes["changed"]
+            for name in changes["changed"]:
+                await _drop_index(collection, name)
+        else:
+            for name in changes["changed"]:
+                logger.warning(
+                    "Index %s.%s differs from the registry, rebuild it with "
+                    "`python -m app.db.indexes sync`",
+                    collection_name,
+                    name,
+                )
+        if drop_extra:
+            for name in changes["extra"]:
+                await _drop_index(collection, name)
+
+        for name in to_create:
+            try:
+                await collection.create_indexes([declared[name]])
+            except OperationFailure as e:
+                logger.error(
+                    "Could not create index %s.%s: %s", collection_name, name, e
+                )
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the MongoDB indexes.")
+    parser.add_argument("command", choices=["diff", "sync"])
+    parser.add_argument(
+        "--drop-extra",
+        action="store_true",
+        help="drop indexes that are not declared in the registry",
+    )
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        diff = asyncio.run(sync_indexes(rebuild=True, drop_extra=args.drop_extra))
+    else:
+        diff = asyncio.run(diff_indexes())
+
+    for collection_name, changes in diff.items():
+        for kind, names in changes.items():
+            for name in names:
+                print(f"{collection_name}: {kind} {name}")
+
+
+if __name__ == "__main__":
+    main()
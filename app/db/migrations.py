@@ -0,0 +1,243 @@
+"""
+migrations.py
+
+This module contains the data migrations of the application. They are
+idempotent, run at startup from the lifespan hook in `app/main.py`, and can be
+run by hand with:
+
+    python -m app.db.migrations
+
+Job openings that belong to no company, such as the ones posted before the
+openings recorded their company, can only be managed once an admin assigns
+them to their company:
+
+    python -m app.db.migrations orphans
+    python -m app.db.migrations assign <company_id> <opening_id>...
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.core.revocation import token_digest
+from app.crud.user import PROFILE_COLLECTIONS
+from app.db.engine import db
+from app.db.indexes import INDEXES
+
+logger = logging.getLogger(__name__)
+
+# Openings without a company, which no company can update or delete.
+ORPHANED_OPENINGS = {"company_id": None}
+
+
+async def migrate_users():
+    """
+    Move the credentials stored on profile documents to the users collection.
+
+    Each profile holding a password gets a user with the same `_id`, and the
+    password is then removed from the profile. A profile whose username or
+    email is already taken by another user is logged and left untouched.
+    """
+    # The unique indexes must exist before copying to detect conflicts.
+    await db.users.create_indexes(INDEXES["users"])
+
+    for role, collection_name in PROFILE_COLLECTIONS.items():
+        profiles = db[collection_name]
+        async for profile in profiles.find({"password": {"$exists": True}}):
+            try:
+                await db.users.update_one(
+                    {"_id": profile["_id"]},
+                    {
+                        "$setOnInsert": {
+                            "username": profile.get("username"),
+                            "email": profile.get("email"),
+                            "password": profile["password"],
+                            "role": profile.get("role", role),
+                        }
+                    },
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                logger.error(
+                    "Could not migrate %s %s: username or email already taken",
+                    collection_name,
+                    profile["_id"],
+                )
+                continue
+
+            await profiles.update_one(
+                {"_id": profile["_id"]}, {"$unset": {"password": ""}}
+            )
+
+
+async def migrate_blocklist():
+    """
+    Convert blocklist entries that store the raw token and an integer expiry
+    into digest entries with a BSON date, so the TTL index can expire them.
+    """
+    async for entry in db.blocklist.find({"token": {"$exists": True}}):
+        expire = entry.get("expire")
+        if isinstance(expire, (int, float)):
+            expire = datetime.utcfromtimestamp(expire)
+        await db.blocklist.update_one(
+            {"_id": entry["_id"]},
+            {
+                "$set": {
+                    "token_hash": token_digest(entry["token"]),
+                    "expire": expire,
+                    "created_at": entry.get("created_at", datetime.utcnow()),
+                },
+                "$unset": {"token": ""},
+            },
+        )
+
+
+async def migrate_company_openings():
+    """
+    Move the openings embedded in company documents to the Opening collection.
+
+    Embedded openings are inserted with the `company_id` of their company;
+    each is upserted on its own content, so a migration interrupted half way
+    does not duplicate them when it runs again. Openings referenced by id get
+    the `company_id` of the company referencing them. The `openings` field is
+    then removed from the company. The openings left without a company are
+    logged, as only an admin can tell which company they belong to.
+    """
+    async for company in db.Company.find({"openings": {"$exists": True}}):
+        company_id = company["_id"]
+        referenced = []
+        for opening in company.get("openings") or []:
+            if isinstance(opening, dict):
+                opening = {k: v for k, v in opening.items() if k != "_id"}
+                await db.Opening.update_one(
+                    {**opening, "company_id": company_id},
+                    {"$setOnInsert": {"version": 0}},
+                    upsert=True,
+                )
+            elif ObjectId.is_valid(opening):
+                referenced.append(ObjectId(opening))
+
+        if referenced:
+            await db.Opening.update_many(
+                {"_id": {"$in": referenced}, "company_id": {"$exists": False}},
+                {"$set": {"company_id": company_id}},
+            )
+        await db.Company.update_one({"_id": company_id}, {"$unset": {"openings": ""}})
+
+    orphans = await db.Opening.count_documents(ORPHANED_OPENINGS)
+    if orphans:
+        logger.warning(
+            "%d job openings belong to no company, list them with "
+            "`python -m app.db.migrations orphans` and assign them with "
+            "`python -m app.db.migrations assign`",
+            orphans,
+        )
+
+
+async def orphaned_openings() -> list[dict]:
+    """
+    Return the job openings that belong to no company.
+    """
+    projection = {"job_role": 1, "job_description": 1}
+    return await db.Opening.find(ORPHANED_OPENINGS, projection).to_list(length=None)
+
+
+async def assign_openings(company_id: ObjectId, opening_ids: list[ObjectId]) -> int:
+    """
+    Assign job openings that belong to no company to `company_id`.
+
+    Returns:
+    - int: The number of openings assigned. Openings that already belong to a
+      company are left untouched.
+
+    Raises:
+    - ValueError: If the company does not exist.
+    """
+    if not await db.Company.count_documents({"_id": company_id}, limit=1):
+        raise ValueError(f"Company {company_id} not found")
+    result = await db.Opening.update_many(
+        {**ORPHANED_OPENINGS, "_id": {"$in": opening_ids}},
+        {"$set": {"company_id": company_id}},
+    )
+    return result.modified_count
+
+
+async def dedupe_waitlist():
+    """
+    Lowercase the waitlist emails and remove the duplicates, keeping the first
+    submission of each email, so that the unique index on `email` can be
+    built.
+
+    Once the index exists it keeps the emails unique, so the migration is
+    skipped instead of grouping the whole collection on every startup.
+    """
+    if "email_unique" in await db.waitlist.index_information():
+        return
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {
+            "$group": {
+                "_id": {"$toLower": "$email"},
+                "ids": {"$push": "$_id"},
+                "emails": {"$push": "$email"},
+            }
+        },
+        {"$match": {"$expr": {"$ne": ["$emails", ["$_id"]]}}},
+    ]
+    async for group in db.waitlist.aggregate(pipeline):
+        first, *duplicates = group["ids"]
+        if duplicates:
+            await db.waitlist.delete_many({"_id": {"$in": duplicates}})
+        if group["emails"][0] != group["_id"]:
+            await db.waitlist.update_one(
+                {"_id": first}, {"$set": {"email": group["_id"]}}
+            )
+
+
+async def run_migrations():
+    await migrate_blocklist()
+    await migrate_users()
+    await migrate_company_openings()
+    await dedupe_waitlist()
+
+
+def _object_id(value: str) -> ObjectId:
+    if not ObjectId.is_valid(value):
+        raise argparse.ArgumentTypeError(f"invalid id: {value!r}")
+    return ObjectId(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the data migrations.")
+    parser.add_argument(
+        "command", nargs="?", default="run", choices=["run", "orphans", "assign"]
+    )
+    parser.add_argument("company_id", nargs="?", type=_object_id)
+    parser.add_argument("opening_ids", nargs="*", type=_object_id)
+    args = parser.parse_args()
+
+    if args.command == "orphans":
+        for opening in asyncio.run(orphaned_openings()):
+            print(
+                opening["_id"],
+                opening.get("job_role"),
+                opening.get("job_description"),
+                sep="\t",
+            )
+    elif args.command == "assign":
+        if args.company_id is None or not args.opening_ids:
+            parser.error("assign needs a company id and opening ids")
+        try:
+            assigned = asyncio.run(assign_openings(args.company_id, args.opening_ids))
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Assigned {assigned} job openings to {args.company_id}")
+    else:
+        asyncio.run(run_migrations())
+
+
+if __name__ == "__main__":
+    main()
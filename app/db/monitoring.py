@@ -0,0 +1,173 @@
+"""
+monitoring.py
+
+This module contains the PyMongo event listeners that record the latency of
+every database command per collection and the time spent waiting for a
+connection from the pool, so that slow queries can be told apart from an
+exhausted pool.
+
+The listeners are called from the threads Motor runs the driver on, so the
+counters are guarded by a lock. Motor runs the driver with a copy of the
+caller's context, which lets `request_db_time` attribute command time to the
+HTTP request that issued it.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+
+# Seconds spent in database commands by the current request, as a one-item
+# list so that the driver threads can add to it.
+request_db_time: ContextVar[Optional[list]] = ContextVar(
+    "request_db_time", default=None
+)
+
+
+class OperationStats:
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, failed: bool = False):
+        self.count += 1
+        self.failures += failed
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "total_seconds": self.total_seconds,
+            "max_seconds": self.max_seconds,
+        }
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Records the latency of database commands per collection and command.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collections: dict[tuple, str] = {}
+        self.operations: dict[tuple[str, str], OperationStats] = defaultdict(
+            OperationStats
+        )
+
+    def _key(self, event) -> tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name == "getMore":
+            # The command's own value is the cursor id.
+            collection = event.command.get("collection")
+        else:
+            collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._collections[self._key(event)] = collection
+
+    def _finished(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        with self._lock:
+            collection = self._collections.pop(self._key(event), "")
+            self.operations[(collection, event.command_name)].record(seconds, failed)
+            db_time = request_db_time.get()
+            if db_time is not None:
+                db_time[0] += seconds
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event, failed=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                f"{collection}.{command}": stats.as_dict()
+                for (collection, command), stats in self.operations.items()
+            }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Records how long operations wait to check a connection out of the pool,
+    how many check-outs fail, and how many connections are in use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # A check-out starts and completes on the same driver thread.
+        self._local = threading.local()
+        self.checkout = OperationStats()
+        self.checkout_failures: dict[str, int] = defaultdict(int)
+        self.in_use = 0
+        self.open = 0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkout.record(waited)
+            self.in_use += 1
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkout.record(waited, failed=True)
+            self.checkout_failures[str(event.reason)] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkout": self.checkout.as_dict(),
+                "checkout_failures": dict(self.checkout_failures),
+                "in_use": self.in_use,
+                "open": self.open,
+            }
+
+
+command_metrics = CommandMetrics()
+pool_metrics = PoolMetrics()
@@ -0,0 +1,232 @@
+"""
+writebehind.py
+
+This module contains the write-behind queues batching the inserts of the
+public submission endpoints, so that a traffic spike on the landing page costs
+one `insert_many` per batch instead of one round-trip per visitor.
+
+Documents are buffered per worker and written in a single unordered
+`insert_many` once `WRITE_BEHIND_BATCH_SIZE` of them are waiting, or
+`WRITE_BEHIND_INTERVAL_MS` after the previous batch. A submission with a
+dedupe key joins a pending submission with the same key instead of being
+queued twice, and the unique indexes reject the duplicates that reach the
+database, which count as written.
+
+A batch that fails as a whole, e.g. while the database is unreachable, is put
+back and retried, and the queue is flushed when the application shuts down,
+so a document is written at least once unless the process dies. With
+`WRITE_BEHIND_ACK` set to "flush" the endpoints answer once the document has
+been written; with "accept" they answer as soon as it is queued.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.config import settings
+from app.db.engine import db
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        collection_name: str,
+        batch_size: int,
+        interval_ms: int,
+        max_pending: int,
+    ):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        # Pending documents by dedupe key, with the future resolved once
+        # they are written.
+        self._pending: OrderedDict[object, tuple[dict, asyncio.Future]] = OrderedDict()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.batches = 0
+
+    def submit(self, document: dict, key: object = None) -> asyncio.Future:
+        """
+        Queue `document` for insertion.
+
+        Parameters:
+        - document (dict): The document. Its `_id` is set when queued.
+        - key: The dedupe key of the document, if any. A document submitted
+          with the key of a pending one is not queued again.
+
+        Returns:
+        - asyncio.Future: Resolved once the document is written, with True if
+          it was inserted, False if it was a duplicate, or None if the
+          database rejected it.
+
+        Raises:
+        - QueueFull: If `max_pending` documents are already waiting.
+        """
+        if key is not None and key in self._pending:
+            pending, future = self._pending[key]
+            document["_id"] = pending["_id"]
+            return future
+
+        if len(self._pending) >= self.max_pending:
+            raise QueueFull(f"{self.collection_name} write queue is full")
+        # insert_many sets missing ids, but callers need the id right away.
+        document.setdefault("_id", ObjectId())
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key if key is not None else document["_id"]] = (document, future)
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        return future
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background writes, then write every pending document.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        while self._pending:
+            if not await self.flush():
+                logger.error(
+                    "Lost %d pending %s documents at shutdown",
+                    len(self._pending),
+                    self.collection_name,
+                )
+                break
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if not await self.flush():
+                # Back off instead of hammering a database that is down.
+                await asyncio.sleep(self.interval * 10)
+
+    async def flush(self) -> bool:
+        """
+        Write one batch of pending documents.
+
+        Returns:
+        - bool: False if the batch could not be written and was put back.
+        """
+        self._full.clear()
+        if not self._pending:
+            return True
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            batch.append(self._pending.popitem(last=False))
+
+        errors = {}
+        try:
+            await db[self.collection_name].insert_many(
+                [document for _, (document, _) in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+        except asyncio.CancelledError:
+            # Stopped mid-write: the batch is written again by `stop`, where
+            # the documents already inserted are rejected as duplicates of
+            # their own `_id`.
+            self._put_back(batch)
+            raise
+        except PyMongoError as e:
+            logger.warning("Could not write %s batch: %s", self.collection_name, e)
+            self._put_back(batch)
+            return False
+
+        self.batches += 1
+        for index, (key, (document, future)) in enumerate(batch):
+            error = errors.get(index)
+            if error is None:
+                self.written += 1
+                result = True
+            elif error.get("code") == DUPLICATE_KEY:
+                self.duplicates += 1
+                result = False
+            else:
+                # Retrying would fail the same way.
+                self.failed += 1
+                result = None
+                logger.error(
+                    "Could not write %s document: %s",
+                    self.collection_name,
+                    error.get("errmsg"),
+                )
+            if not future.done():
+                future.set_result(result)
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        return True
+
+    def _put_back(self, batch: list):
+        # In front, keeping the submissions queued since then behind it.
+        for key, entry in reversed(batch):
+            self._pending[key] = entry
+            self._pending.move_to_end(key, last=False)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+waitlist_queue = WriteBehindQueue(
+    "waitlist",
+    settings.WRITE_BEHIND_BATCH_SIZE,
+    settings.WRITE_BEHIND_INTERVAL_MS,
+    settings.WRITE_BEHIND_MAX_PENDING,
+)
+contact_queue = WriteBehindQueue(
+    "contact",
+    settings.WRITE_BEHIND_BATCH_SIZE,
+    settings.WRITE_BEHIND_INTERVAL_MS,
+    settings.WRITE_BEHIND_MAX_PENDING,
+)
+write_behind_queues = [waitlist_queue, contact_queue]
+
+
+async def acknowledge(future: asyncio.Future) -> Optional[bool]:
+    """
+    Wait for a submission to be written, as `WRITE_BEHIND_ACK` requires.
+
+    Returns:
+    - bool: The result of the write with the "flush" ack mode, True with the
+      "accept" mode, where the document is only queued.
+
+    Raises:
+    - asyncio.TimeoutError: If the document is not written within
+      `WRITE_BEHIND_ACK_TIMEOUT_SECONDS`. It stays queued.
+    """
+    if settings.WRITE_BEHIND_ACK == "accept":
+        return True
+    # Shielded, so that a timeout does not cancel the write for others
+    # waiting on the same document.
+    return await asyncio.wait_for(
+        asyncio.shield(future), settings.WRITE_BEHIND_ACK_TIMEOUT_SECONDS
+    )
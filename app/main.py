@@ -1,18 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from starlette.middleware.cors import CORSMiddleware
 from pymongo.errors import ServerSelectionTimeoutError
 from functools import lru_cache
 from app.core.config import settings
-from app.db.engine import check_db_connection
+from app.core.responses import MongoJSONResponse
+from app.db.engine import check_db_connection, probe_db_connection_periodically
 from app.api.api_v1.api import api_router
+from app.db.indexes import sync_indexes
+from app.db.migrations import run_migrations
+from app.core.revocation import sync_revocations_periodically
+from app.core.matching import rebuild_skill_index_periodically
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, metrics
+from app.core.log import RequestIdMiddleware, setup_logging
+from app.core.ratelimit import RateLimitMiddleware
+from app.db.writebehind import write_behind_queues
+
+log_listener = setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener.start()
+    await run_migrations()
+    await sync_indexes()
+    for queue in write_behind_queues:
+        queue.start()
+    background_tasks = [
+        asyncio.create_task(sync_revocations_periodically()),
+        asyncio.create_task(probe_db_connection_periodically()),
+        asyncio.create_task(rebuild_skill_index_periodically()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    for queue in write_behind_queues:
+        await queue.stop()
+    log_listener.stop()
 
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
+    default_response_class=MongoJSONResponse,
 )
 
+# Inside CORS, so that rejected requests still carry the CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -23,6 +62,13 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+app.add_middleware(RequestIdMiddleware)
+# Inside the metrics, so that the recorded response sizes are the bytes sent
+app.add_middleware(CompressionMiddleware)
+# Outermost, so that the recorded latency covers the whole middleware stack
+app.add_middleware(MetricsMiddleware)
+app.add_route("/metrics", metrics, include_in_schema=False)
+
 
 @app.get(
     "/",
@@ -30,8 +76,8 @@ if settings.BACKEND_CORS_ORIGINS:
     responses={404: {"description": "Not found"}, 200: {"description": "OK"}},
     tags=["root"],
 )
-def read_root():
-    db_status = check_db_connection()
+async def read_root():
+    db_status = await check_db_connection()
     return f"""<h1>Kerala Devs</h1>
     <p>API is working fine</p>
     <p>Database status: {db_status["status"]}</p>
@@ -0,0 +1,29 @@
+"""
+common.py
+
+This module contains the data models and types shared by the schemas of
+several collections.
+"""
+from typing import Annotated, List
+
+from bson import ObjectId
+from pydantic import BaseModel, BeforeValidator, Field
+
+# A reference to another document, stored as an ObjectId and returned as str.
+ObjectIdStr = Annotated[
+    str, BeforeValidator(lambda v: str(v) if isinstance(v, ObjectId) else v)
+]
+
+
+class ArrayPatch(BaseModel):
+    """
+    Changes to the elements of an array field, applied without rewriting the
+    rest of the array. An array field can either be added to or removed from
+    in a single update.
+    """
+
+    add: List[str] = Field(default=[])
+    remove: List[str] = Field(default=[])
+
+    class Config:
+        json_schema_extra = {"example": {"add": ["Rust"], "remove": ["Perl"]}}
@@ -4,10 +4,11 @@ company.py
 This module contains the data models for handling operations related to job openings in companies.
 
 """
-from typing import Optional, List, Annotated
+from typing import Optional, List, Annotated, Union
 from pydantic import BaseModel, Field, EmailStr
 from enum import Enum
 from bson import ObjectId
+from app.schemas.common import ArrayPatch, ObjectIdStr
 
 
 class OpeningStatus(str, Enum):
@@ -45,17 +46,29 @@ class Opening(BaseModel):
 
 class OpeningOut(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    company_id: Optional[ObjectIdStr] = None
     skills_needed: Optional[List[str]] = None
     qualification_required: Optional[str] = None
     job_role: Optional[str] = None
     job_description: Optional[str] = None
     no_of_openings: Optional[int] = None
     status: Optional[OpeningStatus] = None
+    version: Optional[int] = None
 
     class Config:
         arbitrary_types_allowed = True
 
 
+class OpeningPage(BaseModel):
+    """
+    A page of job openings, with the cursor of the next page.
+    """
+
+    status: str = "success"
+    data: List[OpeningOut]
+    next_cursor: Optional[str] = None
+
+
 class OpeningUpdate(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     skills_needed: Optional[List[str]] = None
@@ -66,9 +79,20 @@ class OpeningUpdate(BaseModel):
     status: Optional[OpeningStatus] = None
 
     class Config:
+        populate_by_name = True
         arbitrary_types_allowed = True
 
 
+class OpeningPatch(OpeningUpdate):
+    """
+    A partial update of a job opening, applied by `build_update`.
+    `skills_needed` can also be added to or removed from with an `ArrayPatch`.
+    """
+
+    skills_needed: Optional[Union[List[str], ArrayPatch]] = None
+    version: Optional[int] = None
+
+
 class CompanyProfile(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     username: Optional[str] = Field(default=None)
@@ -80,10 +104,10 @@ class CompanyProfile(BaseModel):
     industry: Optional[str] = Field(default=None)
     detail_intro: Optional[str] = Field(default=None)
     location: Optional[str] = Field(default=None)  # link from google maps
-    openings: Optional[List[Opening]] = Field(default=None)
     socials: Optional[dict] = Field(default=None)  # e.g., {"LinkedIn": "<link>", etc}
     website: Optional[str] = Field(default=None)
     contact: Optional[str] = Field(default=None)
+    version: Optional[int] = Field(default=None)
 
     class Config:
         populate_by_name = True
@@ -97,7 +121,6 @@ class CompanyProfile(BaseModel):
                 "industry": "Tech",
                 "detail_intro": "Detailed introduction about the company",
                 "location": "Location from Google Maps API",
-                "openings": [],
                 "socials": {"LinkedIn": "<link>"},
                 "website": "https://company.com",
             }
@@ -116,7 +139,6 @@ class UpdateCompanyProfileModel(BaseModel):
     industry: Optional[str] = None
     detail_intro: Optional[str] = None
     location: Optional[str] = None
-    openings: Optional[List[str]] = None
     socials: Optional[dict] = None
     website: Optional[str] = None
 
@@ -132,8 +154,15 @@ class UpdateCompanyProfileModel(BaseModel):
                 "industry": "Tech",
                 "detail_intro": "Detailed introduction about the company",
                 "location": "Location from Google Maps API",
-                "openings": [],
                 "socials": {"LinkedIn": "<link>"},
                 "website": "https://company.com",
             }
         }
+
+
+class CompanyPatch(UpdateCompanyProfileModel):
+    """
+    A partial update of a company profile, applied by `build_update`.
+    """
+
+    version: Optional[int] = None
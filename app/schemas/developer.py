@@ -3,10 +3,11 @@ developer.py
 
 This module contains the data models for handling operations related to developers.
 """
-from typing import Optional, List, Annotated
+from typing import Optional, List, Annotated, Union
 from pydantic import BaseModel, Field, EmailStr
 from enum import Enum
 from bson import ObjectId
+from app.schemas.common import ArrayPatch
 
 
 PyObjectId = Annotated[str, Field(alias="_id", default=None)]
@@ -34,6 +35,7 @@ class DeveloperProfile(BaseModel):
     location: str = Field(default=None)  # link from google maps
     socials: Optional[dict] = Field(default=None)  # e.g., {"LinkedIn": "<link>", etc}
     website: Optional[str] = Field(default=None)
+    version: Optional[int] = Field(default=None)
 
     class Config:
         populate_by_name = True
@@ -90,3 +92,13 @@ class UpdateDeveloperModel(BaseModel):
                 "website": "https://developer.com",
             }
         }
+
+
+class DeveloperPatch(UpdateDeveloperModel):
+    """
+    A partial update of a developer profile, applied by `build_update`.
+    `skills` can also be added to or removed from with an `ArrayPatch`.
+    """
+
+    skills: Optional[Union[List[str], ArrayPatch]] = None
+    version: Optional[int] = None
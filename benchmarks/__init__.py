@@ -0,0 +1,27 @@
+"""
+benchmarks
+
+This package contains the benchmarks of the application. They run against the
+MongoDB server of `MONGODB_URI`, in a database of their own named by
+`BENCHMARK_DB`, which they drop before seeding it; e.g.:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.job_board
+
+Each benchmark documents its own options, see `--help`.
+"""
+import os
+import statistics
+
+# Set before the application reads its settings.
+os.environ["MONGODB_NAME"] = os.environ.get("BENCHMARK_DB", "keraladevs_bench")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+
+def summary(latencies: list[float]) -> str:
+    """
+    Format the p50 and p99 of `latencies`, given in seconds, in milliseconds.
+    """
+    if len(latencies) < 2:
+        return f"p50 {latencies[0] * 1000:.1f} ms" if latencies else "no samples"
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return f"p50 {cuts[49] * 1000:.1f} ms, p99 {cuts[98] * 1000:.1f} ms"
@@ -0,0 +1,115 @@
+"""
+job_board.py
+
+This module benchmarks the job board query on synthetic openings, and reports
+the plan of every filter and sort, which must use an index:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.job_board \
+        [--openings 500000] [--runs 50]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks import summary
+from app.crud.job import (
+    JobSort,
+    SkillMatch,
+    board_filter,
+    page_pipeline,
+    query_openings,
+)
+from app.crud.search import SEARCH_COLLATION
+from app.db.engine import db
+from app.db.indexes import INDEXES, plan_stages
+from app.schemas.company import OpeningStatus
+
+SKILLS = ["Python", "Go", "Rust", "Java", "SQL", "React", "Kotlin", "Swift"]
+ROLES = ["Backend Developer", "Frontend Developer", "Data Engineer", "SRE"]
+QUALIFICATIONS = ["B.Tech", "MCA", "M.Tech", "None"]
+
+# Each supported filter, on its own and combined with the others.
+BOARD_QUERIES = {
+    "status": {},
+    "statuses": {"status": [OpeningStatus.active, OpeningStatus.paused]},
+    "skills all": {"skills": ["Python", "Go"]},
+    "skills any": {"skills": ["Python", "Go"], "skill_match": SkillMatch.any},
+    "job role": {"job_role": "Backend Developer"},
+    "qualification": {"qualification": "B.Tech"},
+    "openings range": {"min_openings": 2, "max_openings": 5},
+    "combined": {"skills": ["Python"], "job_role": "SRE", "min_openings": 2},
+}
+
+
+async def seed(count: int, batch_size: int = 10000):
+    rng = random.Random(19)
+    statuses = [status.value for status in OpeningStatus]
+    for start in range(0, count, batch_size):
+        await db.Opening.insert_many(
+            {
+                "status": rng.choices(statuses, weights=[6, 3, 1])[0],
+                "skills_needed": rng.sample(SKILLS, rng.randint(1, 4)),
+                "job_role": rng.choice(ROLES),
+                "qualification_required": rng.choice(QUALIFICATIONS),
+                "job_description": "Synthetic opening",
+                "no_of_openings": rng.randint(1, 10),
+                "version": 0,
+            }
+            for _ in range(min(batch_size, count - start))
+        )
+    await db.Opening.create_indexes(INDEXES["Opening"])
+
+
+async def explain(query: dict, sort: JobSort) -> set[str]:
+    plan = await db.command(
+        "explain",
+        {
+            "aggregate": "Opening",
+            "pipeline": page_pipeline(query, sort),
+            "cursor": {},
+            "collation": SEARCH_COLLATION.document,
+        },
+        verbosity="queryPlanner",
+    )
+    return plan_stages(plan)
+
+
+async def measure(query: dict, sort: JobSort, runs: int, facets: bool) -> list:
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await query_openings(query, sort, facets=facets)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def main(openings: int, runs: int):
+    await db.client.drop_database(db.name)
+    started = time.perf_counter()
+    await seed(openings)
+    print(f"Seeded {openings} openings in {time.perf_counter() - started:.0f} s")
+
+    collection_scans = 0
+    for name, filters in BOARD_QUERIES.items():
+        query = board_filter(**{"status": [OpeningStatus.active], **filters})
+        for sort in JobSort:
+            stages = await explain(query, sort)
+            collection_scans += "COLLSCAN" in stages
+            plan = "+".join(sorted(stages & {"COLLSCAN", "IXSCAN"}))
+            latencies = await measure(query, sort, runs, facets=False)
+            print(f"{name:15} {sort.value:9} {plan:9} {summary(latencies)}")
+        latencies = await measure(query, JobSort.newest, runs, facets=True)
+        print(f"{name:15} {'facets':9} {'':9} {summary(latencies)}")
+
+    await db.client.drop_database(db.name)
+    if collection_scans:
+        raise SystemExit(f"{collection_scans} board queries scan the collection")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the job board query.")
+    parser.add_argument("--openings", type=int, default=500000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.openings, args.runs))
@@ -0,0 +1,101 @@
+"""
+latency.py
+
+This module benchmarks the latency of reading developer profiles at a fixed
+concurrency, which shows how much the database calls hold up the event loop.
+Every request checks the token and reads a profile, two round-trips:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.latency \
+        [--concurrency 50] [--requests 5000]
+
+The requests are sent in process, through the ASGI interface of the
+application, so that the figures do not depend on a web server. To compare
+with another version of the application, e.g. the one before the move to
+Motor, point `--app-dir` at a checkout of it:
+
+    git worktree add /tmp/before <commit>
+    python -m benchmarks.latency --app-dir /tmp/before
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from benchmarks import summary
+
+PROFILES = 100
+
+
+def seed(uri: str, db_name: str) -> list[ObjectId]:
+    # Seeded with PyMongo, as the application may be any version of it.
+    client = MongoClient(uri)
+    client.drop_database(db_name)
+    profiles = [
+        {
+            "_id": ObjectId(),
+            "role": "developer",
+            "name": f"Developer {n}",
+            "skills": ["Python"],
+            "experience": "2 years",
+            "location": "Kochi",
+        }
+        for n in range(PROFILES)
+    ]
+    client[db_name].Developers.insert_many(profiles)
+    client.close()
+    return [profile["_id"] for profile in profiles]
+
+
+async def run(ids: list[ObjectId], concurrency: int, requests: int):
+    import httpx
+
+    from app.core.security import create_access_token
+    from app.main import app
+
+    token = create_access_token(
+        {"sub": str(ObjectId()), "username": "benchmark", "role": "company"}
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    latencies, pending = [], list(range(requests))
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", headers=headers
+        ) as client:
+
+            async def worker():
+                while pending:
+                    developer_id = ids[pending.pop() % len(ids)]
+                    started = time.perf_counter()
+                    response = await client.get(f"/api/v1/developers/{developer_id}")
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+    print(
+        f"{requests} requests at concurrency {concurrency}: "
+        f"{summary(latencies)}, {requests / elapsed:.0f} requests/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark profile reads.")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--app-dir", help="Checkout of the application to run")
+    args = parser.parse_args()
+    if args.app_dir:
+        sys.path.insert(0, args.app_dir)
+
+    from app.core.config import settings
+
+    ids = seed(settings.MONGODB_URI, settings.MONGODB_NAME)
+    asyncio.run(run(ids, args.concurrency, args.requests))
+    MongoClient(settings.MONGODB_URI).drop_database(settings.MONGODB_NAME)
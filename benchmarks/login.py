@@ -0,0 +1,133 @@
+"""
+login.py
+
+This module benchmarks a burst of concurrent logins, and how responsive the
+rest of the API stays meanwhile. A probe reads the job list at a fixed rate
+during the burst, and its latency is counted from when it was due, so that a
+blocked event loop shows up even when the probe could not be sent:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.login \
+        [--logins 200] [--probe-interval 0.02]
+
+The hashing pool is sized by `PASSWORD_HASH_WORKERS` and
+`PASSWORD_HASH_QUEUE_SIZE`; logins beyond the queue are answered with 503.
+Every login comes from the same client, so the per-IP rate limits and the
+cap on in-flight requests are lifted unless `RATE_LIMITS` and
+`MAX_IN_FLIGHT_REQUESTS` are set.
+
+Like `benchmarks.latency`, `--app-dir` runs another checkout of the
+application, e.g. the one hashing on the event loop.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+from bson import ObjectId
+from passlib.context import CryptContext
+from pymongo import MongoClient
+
+from benchmarks import summary
+
+PASSWORD = "benchmark-password"
+
+
+def seed(uri: str, db_name: str, logins: int):
+    # Stored on the profiles, where every version of the application finds
+    # them; later versions move them to `users` when migrating at startup.
+    client = MongoClient(uri)
+    client.drop_database(db_name)
+    # Hashing once is enough, logins verify it all the same.
+    hashed = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+    client[db_name].Developers.insert_many(
+        {
+            "username": f"developer{n}",
+            "email": f"developer{n}@example.com",
+            "password": hashed,
+            "role": "developer",
+        }
+        for n in range(logins)
+    )
+    client[db_name].Opening.insert_many(
+        {"job_role": "Backend Developer", "status": "active", "no_of_openings": 1}
+        for _ in range(20)
+    )
+    client.close()
+
+
+async def run(logins: int, probe_interval: float):
+    import httpx
+
+    from app.core.security import create_access_token
+    from app.main import app
+
+    token = create_access_token(
+        {"sub": str(ObjectId()), "username": "benchmark", "role": "company"}
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    probes, statuses, login_latencies = [], Counter(), []
+    burst_done = asyncio.Event()
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=None
+        ) as client:
+
+            async def probe(due: float):
+                response = await client.get("/api/v1/job/list", headers=headers)
+                response.raise_for_status()
+                probes.append(time.perf_counter() - due)
+
+            async def prober():
+                started, sent, tasks = time.perf_counter(), 0, []
+                while not burst_done.is_set():
+                    due = started + sent * probe_interval
+                    await asyncio.sleep(max(0, due - time.perf_counter()))
+                    tasks.append(asyncio.create_task(probe(due)))
+                    sent += 1
+                await asyncio.gather(*tasks)
+
+            async def login(n: int):
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/user/token",
+                    data={"username": f"developer{n}", "password": PASSWORD},
+                )
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    login_latencies.append(time.perf_counter() - started)
+
+            probing = asyncio.create_task(prober())
+            started = time.perf_counter()
+            await asyncio.gather(*(login(n) for n in range(logins)))
+            elapsed = time.perf_counter() - started
+            burst_done.set()
+            await probing
+
+    print(f"{logins} logins in {elapsed:.1f} s, statuses {dict(statuses)}")
+    print(f"successful logins: {summary(login_latencies)}")
+    print(
+        f"{len(probes)} job list probes during the burst: {summary(probes)}, "
+        f"max {max(probes) * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent logins.")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    parser.add_argument("--app-dir", help="Checkout of the application to run")
+    args = parser.parse_args()
+    if args.app_dir:
+        sys.path.insert(0, args.app_dir)
+    os.environ.setdefault("RATE_LIMITS", "{}")
+    os.environ.setdefault("MAX_IN_FLIGHT_REQUESTS", "1000000")
+
+    from app.core.config import settings
+
+    seed(settings.MONGODB_URI, settings.MONGODB_NAME, args.logins)
+    asyncio.run(run(args.logins, args.probe_interval))
+    MongoClient(settings.MONGODB_URI).drop_database(settings.MONGODB_NAME)
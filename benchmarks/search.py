@@ -0,0 +1,126 @@
+"""
+search.py
+
+This module benchmarks the developer search on synthetic profiles, comparing
+the unanchored case-insensitive regex the search used to run with the indexed
+prefix, exact and full-text modes:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.search \
+        [--developers 100000] [--runs 50]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks import summary
+from app.crud.search import (
+    SEARCH_COLLATION,
+    SearchMode,
+    search_collection,
+    search_query,
+)
+from app.db.engine import db
+from app.db.indexes import INDEXES, plan_stages
+
+SYLLABLES = ["ar", "ju", "na", "vi", "ra", "sh", "an", "ke", "mi", "th", "su", "de"]
+SKILLS = ["Python", "Go", "Rust", "Java", "SQL", "React", "Kotlin", "Swift"]
+LOCATIONS = ["Kochi", "Thiruvananthapuram", "Kozhikode", "Thrissur", "Kannur"]
+
+# (field, value, mode) of the searches.
+SEARCHES = [
+    ("name", "Arju", SearchMode.prefix),
+    ("name", "arjuna", SearchMode.exact),
+    ("skills", "rust", SearchMode.exact),
+    ("location", "thrissur", SearchMode.prefix),
+    (None, "Arjuna Rust", SearchMode.text),
+]
+
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+
+
+async def seed(count: int, batch_size: int = 10000):
+    rng = random.Random(3)
+    for start in range(0, count, batch_size):
+        await db.Developers.insert_many(
+            {
+                "role": "developer",
+                "name": _name(rng),
+                "skills": rng.sample(SKILLS, rng.randint(1, 4)),
+                "location": rng.choice(LOCATIONS),
+                "experience": f"{rng.randint(0, 15)} years",
+            }
+            for _ in range(min(batch_size, count - start))
+        )
+    await db.Developers.create_indexes(INDEXES["Developers"])
+
+
+def regex_query(field: str, value: str) -> dict:
+    # The query of the search before it was restricted to indexed matches,
+    # which returned every match.
+    return {"role": "developer", field: {"$regex": value, "$options": "i"}}
+
+
+async def explain(query: dict, collation=None) -> tuple[set[str], int]:
+    command = {"find": "Developers", "filter": query, "limit": 50}
+    if collation is not None:
+        command["collation"] = collation.document
+    plan = await db.command("explain", command, verbosity="executionStats")
+    return plan_stages(plan), plan["executionStats"]["totalDocsExamined"]
+
+
+async def measure(search, runs: int) -> tuple[list, int]:
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        results = await search()
+        latencies.append(time.perf_counter() - started)
+    return latencies, len(results)
+
+
+def report(label: str, latencies: list, results: int, stages: set, examined: int):
+    plan = "+".join(sorted(stages & {"COLLSCAN", "IXSCAN", "TEXT_MATCH"}))
+    print(
+        f"{label:32} {summary(latencies)}, {results} results, "
+        f"{plan}, {examined} documents examined"
+    )
+
+
+async def main(developers: int, runs: int):
+    await db.client.drop_database(db.name)
+    started = time.perf_counter()
+    await seed(developers)
+    print(f"Seeded {developers} developers in {time.perf_counter() - started:.0f} s")
+
+    for field, value, mode in SEARCHES:
+        if field is not None:
+            regex = regex_query(field, value)
+            latencies, results = await measure(
+                lambda: db.Developers.find(regex).to_list(length=None), runs
+            )
+            stages, examined = await explain(regex)
+            report(f"regex {field}={value!r}", latencies, results, stages, examined)
+
+        latencies, results = await measure(
+            lambda: search_collection(
+                db.Developers, {"role": "developer"}, field, value, mode
+            ),
+            runs,
+        )
+        query = search_query("Developers", {"role": "developer"}, field, value, mode)
+        collation = None if mode == SearchMode.text else SEARCH_COLLATION
+        stages, examined = await explain(query, collation)
+        label = f"{mode.value} {field or 'text'}={value!r}"
+        report(label, latencies, results, stages, examined)
+
+    await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the developer search.")
+    parser.add_argument("--developers", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.developers, args.runs))
@@ -0,0 +1,71 @@
+"""
+conftest.py
+
+This module contains the fixtures of the tests. The tests run against the
+MongoDB server of `MONGODB_URI`, in a database of their own named by
+`MONGODB_TEST_NAME`, which is dropped afterwards; they are skipped when the
+server cannot be reached. The tests of the data access helpers run against an
+in-memory mock of the database instead.
+"""
+import os
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGODB_URI = os.environ.get("MONGODB_URI")
+
+# Set before the application reads its settings.
+os.environ["MONGODB_NAME"] = os.environ.get("MONGODB_TEST_NAME", "keraladevs_test")
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+
+@pytest.fixture(scope="session")
+def mongo():
+    if not MONGODB_URI:
+        pytest.skip("MONGODB_URI is not set")
+    mongo = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=2000)
+    try:
+        mongo.admin.command("ping")
+    except PyMongoError as e:
+        pytest.skip(f"MongoDB is not reachable: {e}")
+    mongo.drop_database(os.environ["MONGODB_NAME"])
+    yield mongo
+    mongo.drop_database(os.environ["MONGODB_NAME"])
+    mongo.close()
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+
+    import app.crud.job
+
+    mock_db = AsyncMongoMockClient()[os.environ["MONGODB_NAME"]]
+    monkeypatch.setattr(app.crud.job, "db", mock_db)
+    return mock_db
+
+
+@pytest.fixture(scope="session")
+def client(mongo):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    # The lifespan runs the migrations and syncs the indexes.
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def company_token(client) -> str:
+    credentials = {"username": "company", "password": "password"}
+    response = client.post(
+        "/api/v1/user/register",
+        data={**credentials, "email": "company@example.com", "role": "company"},
+    )
+    assert response.status_code == 200, response.text
+    response = client.post("/api/v1/user/token", data=credentials)
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
@@ -0,0 +1,13 @@
+def test_create_profiles_without_email(client, company_token):
+    # Both are stored with `email: null`, which the unique index must allow.
+    headers = {"Authorization": f"Bearer {company_token}"}
+    for name in ("First Developer", "Second Developer"):
+        profile = {
+            "name": name,
+            "skills": ["Python"],
+            "experience": "2 years",
+            "location": "Kochi",
+        }
+        response = client.post("/api/v1/developers/post", json=profile, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["email"] is None
@@ -0,0 +1,63 @@
+import os
+import random
+
+import pytest
+
+from app.crud.job import JobSort, SkillMatch, board_filter, board_indexes, page_pipeline
+from app.crud.search import SEARCH_COLLATION
+from app.db.indexes import plan_stages
+from app.schemas.company import OpeningStatus
+
+# Each supported filter, on its own and combined with the others.
+BOARD_FILTERS = [
+    {},
+    {"status": [OpeningStatus.active, OpeningStatus.paused]},
+    {"skills": ["python", "go"]},
+    {"skills": ["python", "go"], "skill_match": SkillMatch.any},
+    {"job_role": "Backend Developer"},
+    {"qualification": "B.Tech"},
+    {"min_openings": 2, "max_openings": 5},
+    {"skills": ["python"], "job_role": "Backend Developer", "min_openings": 2},
+]
+
+
+@pytest.fixture(scope="module")
+def openings(mongo):
+    collection = mongo[os.environ["MONGODB_NAME"]]["Opening_board_test"]
+    collection.drop()
+    rng = random.Random(19)
+    skills = ["Python", "Go", "Rust", "Java", "SQL", "React"]
+    collection.insert_many(
+        {
+            "status": rng.choice(list(OpeningStatus)).value,
+            "skills_needed": rng.sample(skills, 2),
+            "job_role": rng.choice(["Backend Developer", "Data Engineer", "SRE"]),
+            "qualification_required": rng.choice(["B.Tech", "MCA", "None"]),
+            "no_of_openings": rng.randint(1, 10),
+        }
+        for _ in range(5000)
+    )
+    collection.create_indexes(board_indexes())
+    yield collection
+    collection.drop()
+
+
+@pytest.mark.parametrize("sort", list(JobSort))
+@pytest.mark.parametrize("filters", BOARD_FILTERS)
+def test_board_query_uses_an_index(openings, filters, sort):
+    pipeline = page_pipeline(
+        board_filter(**{"status": [OpeningStatus.active], **filters}), sort
+    )
+    plan = openings.database.command(
+        "explain",
+        {
+            "aggregate": openings.name,
+            "pipeline": pipeline,
+            "cursor": {},
+            "collation": SEARCH_COLLATION.document,
+        },
+        verbosity="queryPlanner",
+    )
+    stages = plan_stages(plan)
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+import app.core.matching
+from app.core.matching import SkillIndex
+
+run = asyncio.run
+
+
+class _Collection:
+    """
+    A collection whose `find` runs `during` once the documents are read, as a
+    write handled while a rebuild awaits the database would.
+    """
+
+    def __init__(self, documents: list, during=None):
+        self.documents = documents
+        self.during = during
+
+    async def find(self, query: dict, projection: dict):
+        for document in self.documents:
+            yield document
+        if self.during is not None:
+            self.during()
+
+
+class _Database:
+    def __init__(self, developers: list, openings: list, during=None):
+        self.Developers = _Collection(developers, during)
+        self.Opening = _Collection(openings)
+
+
+def test_rebuild_keeps_writes_made_meanwhile(monkeypatch):
+    index = SkillIndex()
+    kept, added, removed = ObjectId(), ObjectId(), ObjectId()
+    developer = ObjectId()
+
+    def during():
+        index.set_opening(added, ["Python"])
+        index.remove_opening(removed)
+        index.set_developer(developer, ["Go"])
+
+    database = _Database(
+        developers=[],
+        openings=[
+            {"_id": kept, "skills_needed": ["Rust"]},
+            {"_id": removed, "skills_needed": ["Python"]},
+        ],
+        during=during,
+    )
+    monkeypatch.setattr(app.core.matching, "db", database)
+    run(index.rebuild())
+
+    assert set(index.openings.skills) == {kept, added}
+    assert set(index.developers.skills) == {developer}
+    assert index.ready
+
+
+def test_rebuild_stops_recording_when_it_fails(monkeypatch):
+    index = SkillIndex()
+
+    def during():
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(app.core.matching, "db", _Database([], [], during))
+    with pytest.raises(RuntimeError):
+        run(index.rebuild())
+    assert index._changes is None
+    assert not index.ready
@@ -0,0 +1,37 @@
+import ipaddress
+
+from starlette.requests import Request
+
+import app.core.metrics
+from app.core.config import settings
+from app.core.metrics import metrics_allowed
+
+
+def request(host: str, authorization: str = None) -> Request:
+    headers = []
+    if authorization is not None:
+        headers.append((b"authorization", authorization.encode()))
+    return Request({"type": "http", "client": (host, 50000), "headers": headers})
+
+
+def test_metrics_are_refused_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+    monkeypatch.setattr(app.core.metrics, "_METRICS_NETWORKS", [])
+    assert not metrics_allowed(request("127.0.0.1"))
+    assert not metrics_allowed(request("127.0.0.1", "Bearer "))
+
+
+def test_metrics_are_served_to_allowed_networks(monkeypatch):
+    networks = [ipaddress.ip_network("10.0.0.0/8")]
+    monkeypatch.setattr(app.core.metrics, "_METRICS_NETWORKS", networks)
+    assert metrics_allowed(request("10.1.2.3"))
+    assert not metrics_allowed(request("192.168.1.2"))
+    assert not metrics_allowed(request("testclient"))
+
+
+def test_metrics_are_served_with_the_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-token")
+    monkeypatch.setattr(app.core.metrics, "_METRICS_NETWORKS", [])
+    assert metrics_allowed(request("192.168.1.2", "Bearer scrape-token"))
+    assert not metrics_allowed(request("192.168.1.2", "Bearer other-token"))
+    assert not metrics_allowed(request("192.168.1.2"))
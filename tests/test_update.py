@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.crud.job import update_openings
+from app.crud.update import apply_update, build_update
+from app.schemas.common import ArrayPatch
+from app.schemas.company import OpeningPatch
+
+run = asyncio.run
+
+
+def find_one(mock_db, job_id: ObjectId) -> dict:
+    return run(mock_db.Opening.find_one({"_id": job_id}))
+
+
+def test_build_update_sets_and_unsets_sent_fields():
+    patch = OpeningPatch(job_role="Backend Developer", job_description=None)
+    assert build_update(patch) == {
+        "$set": {"job_role": "Backend Developer"},
+        "$unset": {"job_description": ""},
+        "$inc": {"version": 1},
+    }
+
+
+def test_build_update_patches_arrays():
+    added = OpeningPatch(skills_needed=ArrayPatch(add=["Rust"]))
+    assert build_update(added)["$addToSet"] == {"skills_needed": {"$each": ["Rust"]}}
+    removed = OpeningPatch(skills_needed=ArrayPatch(remove=["Perl"]))
+    assert build_update(removed)["$pull"] == {"skills_needed": {"$in": ["Perl"]}}
+
+
+def test_build_update_rejects_adding_and_removing():
+    patch = OpeningPatch(skills_needed=ArrayPatch(add=["Rust"], remove=["Perl"]))
+    with pytest.raises(HTTPException) as e:
+        build_update(patch)
+    assert e.value.status_code == 422
+
+
+def test_build_update_without_changes():
+    assert build_update(OpeningPatch(version=3)) == {}
+
+
+def test_apply_update_increments_version(mock_db):
+    job_id = run(mock_db.Opening.insert_one({"job_role": "Tester"})).inserted_id
+    update = build_update(OpeningPatch(job_role="Developer"))
+    document = run(apply_update(mock_db.Opening, job_id, update, version=0))
+    assert document["job_role"] == "Developer"
+    assert document["version"] == 1
+
+
+def test_apply_update_rejects_stale_version(mock_db):
+    job_id = run(mock_db.Opening.insert_one({"version": 4})).inserted_id
+    update = build_update(OpeningPatch(job_role="Developer"))
+    with pytest.raises(HTTPException) as e:
+        run(apply_update(mock_db.Opening, job_id, update, version=3))
+    assert e.value.status_code == 409
+    assert "job_role" not in find_one(mock_db, job_id)
+
+
+def test_apply_update_of_missing_document(mock_db):
+    update = build_update(OpeningPatch(job_role="Developer"))
+    document = run(apply_update(mock_db.Opening, ObjectId(), update, version=1))
+    assert document is None
+
+
+def test_update_openings_reports_every_outcome(mock_db):
+    company_id, other_company_id = ObjectId(), ObjectId()
+    inserted = mock_db.Opening.insert_many(
+        [
+            {"company_id": company_id, "version": 4},
+            {"company_id": company_id, "version": 4},
+            {"company_id": company_id},
+            {"company_id": other_company_id},
+        ]
+    )
+    stale, current, unversioned, foreign = run(inserted).inserted_ids
+    patches = [
+        OpeningPatch(id=str(stale), version=3, job_role="Developer"),
+        OpeningPatch(id=str(current), version=4, job_role="Developer"),
+        OpeningPatch(id=str(unversioned), job_role="Developer"),
+        OpeningPatch(id=str(foreign), job_role="Developer"),
+        OpeningPatch(id=str(ObjectId()), version=1, job_role="Developer"),
+        OpeningPatch(id="not an id", job_role="Developer"),
+    ]
+    results = run(update_openings(patches, company_id))
+
+    assert [result["status"] for result in results] == [
+        "conflict",
+        "updated",
+        "updated",
+        "not_found",
+        "not_found",
+        "error",
+    ]
+    assert [result["index"] for result in results] == list(range(len(patches)))
+    assert "job_role" not in find_one(mock_db, stale)
+    assert find_one(mock_db, current)["version"] == 5
+    assert find_one(mock_db, unversioned)["version"] == 1